@@ -255,7 +255,9 @@ async function uploadExcelFile() {
 }
 
 async function uploadImagesFolder() {
-    const formData = new FormData();
+    // Upload in batches so the server enrolls earlier batches while later ones are still uploading
+    const batchSize = 16;
+    const uploads = [];
     
     // Add all files with correct naming convention
     imagesFiles.forEach((file, index) => {
@@ -265,52 +267,100 @@ async function uploadImagesFolder() {
             const originalFileName = pathParts[pathParts.length - 1];
             
             // Create a new File object with the correct name for the backend
-            const newFile = new File([file], `images_${studentId}_${index}_${originalFileName}`, {
+            uploads.push(new File([file], `images_${studentId}_${index}_${originalFileName}`, {
                 type: file.type,
                 lastModified: file.lastModified
-            });
-            
-            formData.append('files', newFile);
+            }));
         }
     });
     
-    const response = await fetch('/api/upload-images', {
-        method: 'POST',
-        body: formData
-    });
-    
-    if (!response.ok) {
-        const error = await response.json();
-        throw new Error(error.detail || 'Image folder upload failed');
+    for (let start = 0; start < uploads.length; start += batchSize) {
+        const formData = new FormData();
+        uploads.slice(start, start + batchSize).forEach(file => formData.append('files', file));
+        
+        const response = await fetch('/api/upload-images?enroll=true', {
+            method: 'POST',
+            body: formData
+        });
+        
+        if (!response.ok) {
+            const error = await response.json();
+            throw new Error(error.detail || 'Image folder upload failed');
+        }
+        
+        await response.json();
+        updateProgress(Math.round(Math.min(start + batchSize, uploads.length) / uploads.length * 100));
     }
     
-    return await response.json();
+    await waitForEnrollment();
+}
+
+// Wait until images enrolled during upload are searchable
+async function waitForEnrollment() {
+    while (true) {
+        const response = await fetch('/api/enrollment-stream');
+        if (!response.ok) {
+            return;  // Process data step enrolls anything left over
+        }
+        
+        const status = await response.json();
+        if (!status.busy) {
+            addLogEntry(`${status.enrolled} images enrolled during upload`, 'info');
+            return;
+        }
+        await new Promise(resolve => setTimeout(resolve, 500));
+    }
 }
 
 async function processData() {
-    const response = await fetch('/api/process-data', {
+    const job = await startJob('/api/process-data', 'Data processing failed');
+    return await waitForJob(job.job_id, 'Data processing failed');
+}
+
+async function updateDatabase() {
+    const job = await startJob('/api/update-database', 'Database update failed');
+    return await waitForJob(job.job_id, 'Database update failed');
+}
+
+async function startJob(url, errorMessage) {
+    const response = await fetch(url, {
         method: 'POST'
     });
     
     if (!response.ok) {
         const error = await response.json();
-        throw new Error(error.detail || 'Data processing failed');
+        throw new Error(error.detail || errorMessage);
     }
     
     return await response.json();
 }
 
-async function updateDatabase() {
-    const response = await fetch('/api/update-database', {
-        method: 'POST'
-    });
+// Poll a background job until it finishes, logging its progress
+async function waitForJob(jobId, errorMessage) {
+    let lastLogged = -1;
     
-    if (!response.ok) {
-        const error = await response.json();
-        throw new Error(error.detail || 'Database update failed');
+    while (true) {
+        await new Promise(resolve => setTimeout(resolve, 1000));
+        
+        const response = await fetch(`/api/jobs/${jobId}`);
+        if (!response.ok) {
+            const error = await response.json();
+            throw new Error(error.detail || errorMessage);
+        }
+        
+        const job = (await response.json()).job;
+        if (job.total && job.done !== lastLogged) {
+            lastLogged = job.done;
+            addLogEntry(`${job.done}/${job.total} images processed`, 'info');
+        }
+        
+        if (job.status === 'succeeded') {
+            return job;
+        }
+        if (job.status === 'failed') {
+            throw new Error(job.message || errorMessage);
+        }
     }
-    
-    return await response.json();
 }
 
 function logout() {
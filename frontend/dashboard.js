@@ -3,6 +3,9 @@ document.addEventListener('DOMContentLoaded', function() {
     // WebSocket connection
     let socket = null;
     let attendanceData = [];
+    let latestEventId = null; // Newest check-in event seen, used to resync after a reconnect
+    let hasConnected = false;
+    const PAGE_SIZE = 100;
     
     // Initialize dashboard
     initializeDashboard();
@@ -21,21 +24,46 @@ document.addEventListener('DOMContentLoaded', function() {
         initializeOtherFeatures();
     }
     
+    // Fetch every page of /today-checkins, following next_cursor
+    async function fetchCheckins(params = {}) {
+        const records = [];
+        let cursor = null;
+        let latest = null;
+        do {
+            const query = new URLSearchParams({ limit: PAGE_SIZE, ...params });
+            if (cursor) {
+                query.set('cursor', cursor);
+            }
+            const response = await fetch(`/today-checkins?${query}`);
+            const result = await response.json();
+            if (!result.success) {
+                throw new Error('Failed to load attendance data');
+            }
+            records.push(...result.data);
+            cursor = result.next_cursor;
+            latest = result.latest_event_id;
+        } while (cursor);
+        return { records, latest };
+    }
+    
+    // Put a check-in at the top, replacing the student's older entry
+    function addAttendance(record) {
+        attendanceData = attendanceData.filter(student => student.student_id !== record.student_id);
+        attendanceData.unshift(record);
+        if (record.event_id && (latestEventId === null || record.event_id > latestEventId)) {
+            latestEventId = record.event_id;
+        }
+    }
+    
     // Load attendance data from API
     async function loadTodayAttendance() {
         try {
             showLoading();
-            const response = await fetch('/today-checkins');
-            const result = await response.json();
-            
-            if (result.success) {
-                attendanceData = result.data;
-                updateTable();
-                console.log(`✅ Loaded ${result.total} attendance records`);
-            } else {
-                console.error('Failed to load attendance data');
-                showError('Unable to load attendance data');
-            }
+            const { records, latest } = await fetchCheckins();
+            attendanceData = records;
+            latestEventId = latest;
+            updateTable();
+            console.log(`✅ Loaded ${records.length} attendance records`);
         } catch (error) {
             console.error('Error loading attendance data:', error);
             showError('Connection error while loading data');
@@ -44,6 +72,24 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     }
     
+    // Fetch only check-ins missed while the WebSocket was down
+    async function syncAttendance() {
+        if (latestEventId === null) {
+            return loadTodayAttendance();
+        }
+        try {
+            const { records, latest } = await fetchCheckins({ since: latestEventId });
+            records.reverse().forEach(addAttendance); // Oldest first so the newest ends up on top
+            if (latest !== null && latest > latestEventId) {
+                latestEventId = latest;
+            }
+            updateTable();
+            console.log(`🔄 Synced ${records.length} missed attendance records`);
+        } catch (error) {
+            console.error('Error syncing attendance data:', error);
+        }
+    }
+    
     // Connect to WebSocket
     function connectWebSocket() {
         const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
@@ -54,6 +100,12 @@ document.addEventListener('DOMContentLoaded', function() {
         socket.onopen = function(event) {
             console.log('✅ WebSocket connected');
             showNotification('Real-time connection successful', 'success');
+            
+            // Catch up on check-ins made while disconnected
+            if (hasConnected) {
+                syncAttendance();
+            }
+            hasConnected = true;
         };
         
         socket.onmessage = function(event) {
@@ -62,7 +114,7 @@ document.addEventListener('DOMContentLoaded', function() {
                 console.log('📨 Received new attendance:', newAttendance);
                 
                 // Add new attendance to the beginning of the array
-                attendanceData.unshift(newAttendance);
+                addAttendance(newAttendance);
                 
                 // Update table
                 updateTable();
@@ -110,14 +162,14 @@ document.addEventListener('DOMContentLoaded', function() {
         }
         
         tableBody.innerHTML = attendanceData.map((student, index) => {
-            const checkinImage = student.checkin_face_base64 
-                ? `<img src="data:image/jpeg;base64,${student.checkin_face_base64}" alt="Recent Check-in" class="attendance-image">`
+            const checkinImage = student.checkin_face_url 
+                ? `<img src="${student.checkin_face_url}" alt="Recent Check-in" class="attendance-image" loading="lazy">`
                 : `<div class="image-placeholder">
                      <i class="fas fa-camera text-gray-500 text-xl"></i>
                    </div>`;
             
-            const avatarImage = student.avatar_base64 
-                ? `<img src="data:image/jpeg;base64,${student.avatar_base64}" alt="Avatar" class="attendance-image">`
+            const avatarImage = student.avatar_url 
+                ? `<img src="${student.avatar_url}" alt="Avatar" class="attendance-image" loading="lazy">`
                 : `<div class="image-placeholder">
                      <i class="fas fa-user text-gray-500 text-xl"></i>
                    </div>`;
@@ -368,6 +420,7 @@ document.addEventListener('DOMContentLoaded', function() {
     // Export functions for potential use
     window.dashboardUtils = {
         loadTodayAttendance,
+        syncAttendance,
         searchStudents,
         showLoading,
         hideLoading,
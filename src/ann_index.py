@@ -0,0 +1,190 @@
+import os
+import sys
+import time
+import numpy as np
+
+ANN_KIND = os.environ.get("FACE_ANN") or None  # None, "exact" or "ivf"
+ANN_NPROBE = int(os.environ.get("FACE_ANN_NPROBE", "8"))
+
+def _normalize(matrix):
+    return matrix / np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+
+class ExactIndex:
+    """Brute-force cosine search; the reference for recall and the baseline for small rosters"""
+
+    kind = "exact"
+
+    def __init__(self, vectors=None, labels=None):
+        self.vectors = np.zeros((0, 512), dtype=np.float32) if vectors is None else vectors
+        self.labels = np.array([], dtype=object) if labels is None else labels
+
+    def __len__(self):
+        return len(self.labels)
+
+    @classmethod
+    def build(cls, vectors, labels, **params):
+        return cls(_normalize(np.asarray(vectors, dtype=np.float32)), np.asarray(labels, dtype=object))
+
+    def search(self, queries):
+        """Best (label, score) for each row of an (M, 512) array"""
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, 512)
+        if len(self.labels) == 0:
+            return [(None, 0.0)] * len(queries)
+        scores = queries @ self.vectors.T
+        best = np.argmax(scores, axis=1)
+        return [(self.labels[i], float(scores[row, i])) for row, i in enumerate(best)]
+
+    def _arrays(self):
+        return {"vectors": self.vectors}
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = path + ".tmp.npz"
+        np.savez(tmp_path, kind=self.kind, labels=np.asarray(self.labels, dtype=str), **self._arrays())
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def _from_arrays(cls, arrays, labels):
+        return cls(arrays["vectors"], labels)
+
+class IVFIndex(ExactIndex):
+    """Inverted-file index: spherical k-means splits vectors into nlist lists and
+    a query only scans the nprobe lists with the closest centroids.
+
+    Vectors are stored grouped by list, so each list is one contiguous slice.
+    Raise nprobe for recall, lower it for speed; nprobe = nlist is exact search.
+    """
+
+    kind = "ivf"
+
+    def __init__(self, centroids, vectors, labels, offsets, nprobe=ANN_NPROBE):
+        super().__init__(vectors, labels)
+        self.centroids = centroids
+        self.offsets = offsets  # List i is vectors[offsets[i]:offsets[i + 1]]
+        self.nprobe = nprobe
+
+    @classmethod
+    def build(cls, vectors, labels, nlist=None, iterations=10, train_size=50000, nprobe=ANN_NPROBE, seed=0):
+        vectors = _normalize(np.asarray(vectors, dtype=np.float32))
+        labels = np.asarray(labels, dtype=object)
+        nlist = nlist or max(1, int(4 * np.sqrt(len(vectors))))
+        nlist = min(nlist, len(vectors)) or 1
+        rng = np.random.default_rng(seed)
+
+        # Spherical k-means on a sample of the vectors
+        train = vectors[rng.choice(len(vectors), min(train_size, len(vectors)), replace=False)] if len(vectors) else vectors
+        centroids = train[rng.choice(len(train), nlist, replace=False)] if len(train) else np.zeros((1, 512), dtype=np.float32)
+        for _ in range(iterations):
+            assignment = np.argmax(train @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, train)
+            empty = np.bincount(assignment, minlength=len(centroids)) == 0
+            sums[empty] = train[rng.choice(len(train), int(empty.sum()))]  # Re-seed empty lists
+            centroids = _normalize(sums)
+
+        assignment = np.argmax(vectors @ centroids.T, axis=1) if len(vectors) else np.zeros(0, dtype=int)
+        order = np.argsort(assignment, kind="stable")
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(assignment, minlength=len(centroids)))])
+        return cls(centroids.astype(np.float32), np.ascontiguousarray(vectors[order]), labels[order], offsets, nprobe)
+
+    def search(self, queries):
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, 512)
+        if len(self.labels) == 0:
+            return [(None, 0.0)] * len(queries)
+
+        nprobe = min(self.nprobe, len(self.centroids))
+        centroid_scores = queries @ self.centroids.T
+        probes = np.argpartition(-centroid_scores, nprobe - 1, axis=1)[:, :nprobe]
+        results = []
+        for query, lists in zip(queries, probes):
+            rows = np.concatenate([np.arange(self.offsets[i], self.offsets[i + 1]) for i in lists])
+            if len(rows) == 0:
+                results.append((None, 0.0))
+                continue
+            scores = self.vectors[rows] @ query
+            best = int(np.argmax(scores))
+            results.append((self.labels[rows[best]], float(scores[best])))
+        return results
+
+    def _arrays(self):
+        return {"vectors": self.vectors, "centroids": self.centroids, "offsets": self.offsets}
+
+    @classmethod
+    def _from_arrays(cls, arrays, labels):
+        return cls(arrays["centroids"], arrays["vectors"], labels, arrays["offsets"])
+
+INDEX_TYPES = {index_type.kind: index_type for index_type in (ExactIndex, IVFIndex)}
+
+def build_index(kind, vectors, labels, **params):
+    if kind not in INDEX_TYPES:
+        raise ValueError(f"Unknown index {kind}, expected one of {', '.join(INDEX_TYPES)}")
+    return INDEX_TYPES[kind].build(vectors, labels, **params)
+
+def load_index(path, nprobe=ANN_NPROBE):
+    """Load an index saved with save(), or None if it doesn't exist"""
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as arrays:
+        kind = str(arrays["kind"])
+        index = INDEX_TYPES[kind]._from_arrays(arrays, arrays["labels"].astype(object))
+    if isinstance(index, IVFIndex):
+        index.nprobe = nprobe
+    return index
+
+def index_path(store, kind):
+    """Index file next to the embedding store it was built from"""
+    return os.path.join(store.store_dir, f"{store.model_version}-{kind}.npz")
+
+def measure_recall(index, vectors, labels, queries=500, noise=0.02, seed=0):
+    """Top-1 agreement of index with exact search on perturbed copies of enrolled vectors, plus ms per query"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if len(vectors) == 0:
+        return {"recall": 1.0, "queries": 0, "index_ms": 0.0, "exact_ms": 0.0}
+    rng = np.random.default_rng(seed)
+    sample = vectors[rng.choice(len(vectors), min(queries, len(vectors)), replace=False)]
+    sample = _normalize(sample + noise * rng.standard_normal(sample.shape).astype(np.float32))
+
+    exact = ExactIndex.build(vectors, labels)
+    start = time.perf_counter()
+    expected = [exact.search(query)[0][0] for query in sample]
+    exact_ms = (time.perf_counter() - start) * 1000 / len(sample)
+    start = time.perf_counter()
+    found = [index.search(query)[0][0] for query in sample]
+    index_ms = (time.perf_counter() - start) * 1000 / len(sample)
+    recall = sum(a == b for a, b in zip(expected, found)) / len(sample)
+    return {"recall": recall, "queries": len(sample), "index_ms": index_ms, "exact_ms": exact_ms}
+
+def build_from_store(store, kind, **params):
+    """Build an index over an EmbeddingStore, save it next to the store and print its recall"""
+    vectors, labels = store.student_matrix()
+    index = build_index(kind, vectors, labels, **params)
+    path = index_path(store, kind)
+    index.save(path)
+    result = measure_recall(index, vectors, labels)
+    print(f"📊 Built {kind} index of {len(index)} vectors: recall@1 {result['recall']:.3f} vs exact, "
+          f"{result['index_ms']:.2f} ms/query (exact {result['exact_ms']:.2f} ms) -> {path}")
+    return index
+
+if __name__ == "__main__":
+    # Build from the Qdrant faces collection and report recall for a range of nprobe values
+    from qdrant_client import QdrantClient
+    from embedding import model_version
+    from embedding_store import EmbeddingStore
+    from face_index import FaceIndex
+
+    kind = sys.argv[1] if len(sys.argv) > 1 else "ivf"
+    face_index = FaceIndex(QdrantClient(host="localhost", port=6333), prototype_candidates=0)
+    if not face_index.load() or len(face_index) == 0:
+        print("❌ No vectors in the faces collection")
+        sys.exit(1)
+    vectors, labels, _ = face_index._snapshot
+    index = build_index(kind, vectors, labels)
+    index.save(index_path(EmbeddingStore(model_version()), kind))
+    for nprobe in (1, 2, 4, 8, 16, 32):
+        if isinstance(index, IVFIndex):
+            index.nprobe = nprobe
+        result = measure_recall(index, vectors, labels)
+        print(f"   nprobe {nprobe:3d}: recall@1 {result['recall']:.3f}, {result['index_ms']:.2f} ms/query "
+              f"(exact {result['exact_ms']:.2f} ms)")
+        if not isinstance(index, IVFIndex):
+            break
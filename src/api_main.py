@@ -1,12 +1,12 @@
-from fastapi import FastAPI, WebSocket, HTTPException, Form, File, UploadFile
+from fastapi import FastAPI, WebSocket, HTTPException, Form, File, UploadFile, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, Response
 import sqlite3
 import hashlib
 import base64
 import json
-from datetime import datetime
+from datetime import datetime, timedelta
 from typing import List, Optional, Dict, Any
 import asyncio
 import uvicorn
@@ -15,6 +15,10 @@ import shutil
 import subprocess
 import pandas as pd
 from pathlib import Path
+from urllib.parse import quote
+from jobs import JobConflict, JobManager
+from database import migrate_schema, time_range
+from db import get_pool
 
 app = FastAPI(title="Face Recognition Attendance API")
 
@@ -96,19 +100,36 @@ def disconnect_websocket(websocket: WebSocket):
 async def send_personal_message(message: str, websocket: WebSocket):
     await websocket.send_text(message)
 
-async def broadcast_message(message: str):
-    for connection in active_connections[:]:  # Copy list to avoid modification during iteration
+async def broadcast_message(message: str, connections: List[WebSocket] = active_connections):
+    for connection in connections[:]:  # Copy list to avoid modification during iteration
         try:
             await connection.send_text(message)
         except:
             # Remove dead connections
-            active_connections.remove(connection)
+            if connection in connections:
+                connections.remove(connection)
 
-# Database functions
-def get_db():
-    conn = sqlite3.connect("students.db")
-    conn.row_factory = sqlite3.Row
-    return conn
+# Background jobs (enrollment, database update); progress is pushed to /ws/jobs
+job_connections: List[WebSocket] = []
+event_loop = None
+
+def publish_job_update(job: Dict[str, Any]):
+    """Called from job supervisor threads; hands the update to the event loop"""
+    if event_loop is not None and not event_loop.is_closed():
+        asyncio.run_coroutine_threadsafe(broadcast_message(json.dumps({"type": "job", **job}), job_connections), event_loop)
+        if job["kind"] == "update-database" and job["status"] == "succeeded":
+            # Names and avatars may have changed
+            event_loop.call_soon_threadsafe(today_view.invalidate)
+
+job_manager = JobManager(on_update=publish_job_update)
+
+@app.on_event("startup")
+async def capture_event_loop():
+    global event_loop
+    event_loop = asyncio.get_running_loop()
+
+# Database functions; queries run on the pool's threads, off the event loop
+db_pool = get_pool()
 
 def hash_password(password: str) -> str:
     """Hash password using SHA-256"""
@@ -118,11 +139,20 @@ def verify_password(password: str, hashed: str) -> bool:
     """Verify password against hash"""
     return hash_password(password) == hashed
 
-def blob_to_base64(blob_data) -> str:
-    """Convert BLOB to base64 string"""
-    if blob_data:
-        return base64.b64encode(blob_data).decode('utf-8')
-    return ""
+def avatar_url(student_id: str, version: str) -> str:
+    return f"/students/{quote(student_id, safe='')}/avatar?v={version}"
+
+def checkin_face_url(event_id: int) -> str:
+    return f"/checkins/{event_id}/face"
+
+@app.on_event("startup")
+async def prepare_database():
+    """Bring older databases up to date (e.g. generate avatar thumbnails) before serving"""
+    await db_pool.run(migrate_schema)
+
+@app.on_event("shutdown")
+async def close_database():
+    db_pool.close()
 
 # Request/Response functions
 def create_login_response(success: bool, message: str, token: Optional[str] = None) -> Dict[str, Any]:
@@ -132,40 +162,68 @@ def create_login_response(success: bool, message: str, token: Optional[str] = No
         response["token"] = token
     return response
 
-def create_student_attendance(student_id: str, name: str, class_name: str, major: str, avatar_base64: str, attendance_time: str, checkin_face_base64: str = "") -> Dict[str, Any]:
-    """Create StudentAttendance object"""
+# /today-checkins response field -> SQL column. Images are served by the image endpoints;
+# the list only reads the avatar's content version and whether a check-in face exists, never the BLOBs
+CHECKIN_FIELDS = {
+    "event_id": "latest.id",
+    "student_id": "s.student_id",
+    "name": "s.name",
+    "class_name": "s.class",
+    "major": "s.major",
+    "attendance_time": "latest.attendance_time",
+    "camera_id": "latest.camera_id",
+    "confidence": "latest.confidence",
+    "avatar_url": "s.avatar_version",
+    "checkin_face_url": "EXISTS (SELECT 1 FROM checkin_faces f WHERE f.event_id = latest.id)"
+}
+MAX_PAGE_SIZE = 500
+
+def create_student_attendance(row: sqlite3.Row, fields: List[str]) -> Dict[str, Any]:
+    """Create StudentAttendance object with the requested fields"""
+    student = {field: row[field] for field in fields}
+    if "avatar_url" in student:
+        student["avatar_url"] = avatar_url(row["student_id"], row["avatar_url"]) if row["avatar_url"] else ""
+    if "checkin_face_url" in student:
+        student["checkin_face_url"] = checkin_face_url(row["event_id"]) if row["checkin_face_url"] else ""
+    return student
+
+def create_attendance_event(event: sqlite3.Row) -> Dict[str, Any]:
+    """Create AttendanceEvent object (no images; has_face tells whether a check-in photo exists)"""
     return {
-        "student_id": student_id,
-        "name": name,
-        "class_name": class_name,
-        "major": major,
-        "avatar_base64": avatar_base64,
-        "attendance_time": attendance_time,
-        "checkin_face_base64": checkin_face_base64
+        "event_id": event["id"],
+        "student_id": event["student_id"],
+        "name": event["name"],
+        "class_name": event["class"],
+        "major": event["major"],
+        "attendance_time": event["attendance_time"],
+        "camera_id": event["camera_id"],
+        "confidence": event["confidence"],
+        "has_face": bool(event["has_face"]),
+        "checkin_face_url": checkin_face_url(event["id"]) if event["has_face"] else ""
     }
 
-def create_today_checkins_response(success: bool, data: List[Dict[str, Any]], total: int) -> Dict[str, Any]:
-    """Create response for today checkins"""
+def create_today_checkins_response(success: bool, data: List[Dict[str, Any]], total: int, count: Optional[int] = None,
+                                   next_cursor: Optional[str] = None, latest_event_id: Optional[int] = None) -> Dict[str, Any]:
+    """Create response for today checkins; total counts every matching student, count those in this page"""
     return {
         "success": success,
         "data": data,
-        "total": total
+        "total": total,
+        "count": len(data) if count is None else count,
+        "next_cursor": next_cursor,
+        "latest_event_id": latest_event_id
     }
 
 # API Routes
 @app.post("/login")
 async def login(username: str = Form(...), password: str = Form(...)):
     """Teacher login API"""
-    conn = get_db()
-    cursor = conn.cursor()
-    
     try:
         # Check login credentials - can be username or email
-        cursor.execute(
+        teacher = await db_pool.fetchone(
             "SELECT username, password_hash, full_name FROM teacher WHERE username = ? OR username LIKE ?",
             (username, f"%{username}%")
         )
-        teacher = cursor.fetchone()
         
         if not teacher:
             return create_login_response(False, "Account does not exist")
@@ -180,53 +238,190 @@ async def login(username: str = Form(...), password: str = Form(...)):
         
     except Exception as e:
         return create_login_response(False, f"Error: {str(e)}")
-    finally:
-        conn.close()
+
+def parse_since(since: str):
+    """since= value as ("id", event_id) or ("time", attendance_time)"""
+    if since.isdigit():
+        return "id", int(since)
+    try:
+        return "time", datetime.fromisoformat(since).strftime("%Y-%m-%d %H:%M:%S")
+    except ValueError:
+        raise HTTPException(status_code=400, detail="since must be an event ID or a timestamp")
+
+def checkin_columns() -> str:
+    """SELECT list of every CHECKIN_FIELDS field, for queries aliasing attendance_events as latest"""
+    return ", ".join(f"{column} AS {field}" for field, column in CHECKIN_FIELDS.items())
+
+def load_today_checkins(conn: sqlite3.Connection, start: str, end: str):
+    """(rows, latest event ID) of every check-in between start and end, newest first"""
+    # Latest check-in of each student in the range (SQLite takes the other columns from the MAX(id) row);
+    # the time range is a range scan on idx_attendance_events_time
+    rows = conn.execute(f"""
+        SELECT {checkin_columns()}
+        FROM (
+            SELECT MAX(id) AS id, student_id, attendance_time, camera_id, confidence
+            FROM attendance_events
+            WHERE attendance_time >= ? AND attendance_time < ?
+            GROUP BY student_id
+        ) AS latest
+        JOIN students s ON s.student_id = latest.student_id
+        ORDER BY latest.id DESC
+    """, (start, end)).fetchall()
+    latest_event_id = conn.execute("SELECT MAX(id) FROM attendance_events").fetchone()[0]
+    return rows, latest_event_id
+
+class TodayCheckins:
+    """Materialized view of today's check-ins behind /today-checkins.
+
+    Loaded from the database once per day (and again after a roster import),
+    then kept current by /notify-attendance. Each record is serialized once;
+    responses are assembled from those bytes and memoized until the next
+    change, so dashboard reads never touch SQLite.
+    """
+
+    def __init__(self, max_pages=256):
+        self.max_pages = max_pages
+        self.day = None  # Date the view holds, None when it must be reloaded
+        self.records = {}  # student_id -> latest check-in record with every CHECKIN_FIELDS field
+        self.encoded = {}  # student_id -> JSON bytes of that record
+        self.order = []  # Records newest first
+        self.latest_event_id = None
+        self.pages = {}  # Query -> response bytes, cleared on every change
+        self._pending = None  # Check-ins reported while a reload is awaited, replayed after it
+        self._generation = 0  # Bumped by invalidate(), so a reload can tell it raced with one
+        self._lock = asyncio.Lock()
+
+    def invalidate(self):
+        self.day = None
+        self._generation += 1
+
+    async def current(self):
+        """The view, reloaded first if it is stale or from an earlier day"""
+        today = datetime.now().date()
+        if self.day != today:
+            async with self._lock:
+                while self.day != today:
+                    generation = self._generation
+                    self._pending = []
+                    try:
+                        rows, latest_event_id = await db_pool.run(load_today_checkins, *time_range(today))
+                    finally:
+                        pending, self._pending = self._pending, None
+                    self.records = {}
+                    self.encoded = {}
+                    for row in rows:
+                        record = create_student_attendance(row, list(CHECKIN_FIELDS))
+                        self.records[record["student_id"]] = record
+                        self.encoded[record["student_id"]] = json.dumps(record).encode()
+                    self.latest_event_id = latest_event_id
+                    self.day = today
+                    for record in pending:
+                        self._apply(record)  # Skipped if the load already saw them
+                    self._changed()
+                    if self._generation != generation:
+                        # Invalidated while loading, the rows may predate a roster import
+                        self.day = None
+                        continue
+                    print(f"📊 Loaded {len(self.records)} check-ins for {today}")
+        return self
+
+    def _changed(self):
+        self.order = sorted(self.records.values(), key=lambda record: record["event_id"], reverse=True)
+        self.pages.clear()
+
+    def add(self, record: Dict[str, Any]):
+        """Apply one check-in reported to /notify-attendance"""
+        if self._pending is not None:
+            self._pending.append(record)  # The reload in progress may or may not include it
+            return
+        if self._apply(record):
+            self._changed()
+
+    def _apply(self, record: Dict[str, Any]) -> bool:
+        if self.day is None or not record["attendance_time"].startswith(self.day.isoformat()):
+            return False  # Not loaded yet, or a late notification from another day
+        previous = self.records.get(record["student_id"])
+        if previous and previous["event_id"] >= record["event_id"]:
+            return False  # Already applied, or out of order
+        self.records[record["student_id"]] = record
+        self.encoded[record["student_id"]] = json.dumps(record).encode()
+        self.latest_event_id = max(self.latest_event_id or 0, record["event_id"])
+        return True
+
+    def page(self, limit: int, cursor: Optional[int], fields: Optional[List[str]], since: Optional[tuple]) -> bytes:
+        """JSON response bytes of one page, newest first; fields None means every field"""
+        key = (limit, cursor, tuple(fields) if fields else None, since)
+        body = self.pages.get(key)
+        if body is not None:
+            return body
+        
+        records = self.order
+        if since and since[0] == "id":
+            records = [record for record in records if record["event_id"] > since[1]]
+        elif since:
+            records = [record for record in records if record["attendance_time"] > since[1]]
+        total = len(records)
+        if cursor is not None:
+            records = [record for record in records if record["event_id"] < cursor]
+        next_cursor = str(records[limit - 1]["event_id"]) if len(records) > limit else None
+        records = records[:limit]
+        
+        if fields is None:
+            data = b",".join(self.encoded[record["student_id"]] for record in records)
+        else:
+            data = b",".join(json.dumps({field: record[field] for field in fields}).encode() for record in records)
+        # Splice the pre-serialized records into the empty "data" list of the response
+        head, tail = json.dumps(create_today_checkins_response(
+            True, [], total, len(records), next_cursor, self.latest_event_id
+        )).encode().split(b"[]", 1)
+        body = head + b"[" + data + b"]" + tail
+        
+        if len(self.pages) >= self.max_pages:
+            self.pages.clear()
+        self.pages[key] = body
+        return body
+
+today_view = TodayCheckins()
+
+@app.on_event("startup")
+async def start_today_rollover():
+    """Reload the today view right after midnight rather than on the first request of the day"""
+    async def roll_over():
+        while True:
+            now = datetime.now()
+            midnight = datetime.combine(now.date() + timedelta(days=1), datetime.min.time())
+            await asyncio.sleep((midnight - now).total_seconds() + 1)
+            try:
+                await today_view.current()
+            except Exception as e:
+                print(f"⚠️ Error loading today's check-ins: {e}")
+    asyncio.create_task(roll_over())
 
 @app.get("/today-checkins")
-async def get_today_checkins():
-    """API to get list of students who checked in today"""
-    conn = get_db()
-    cursor = conn.cursor()
+async def get_today_checkins(limit: int = 100, cursor: Optional[str] = None, fields: Optional[str] = None, since: Optional[str] = None):
+    """API to get list of students who checked in today, newest first.
+    
+    Pages hold up to limit students; pass the returned next_cursor to get the next one.
+    fields is a comma separated subset of CHECKIN_FIELDS.
+    since= (an event ID such as latest_event_id, or a timestamp) returns only newer check-ins.
+    """
+    selected = [field.strip() for field in fields.split(",") if field.strip()] if fields else None
+    unknown = [field for field in selected or [] if field not in CHECKIN_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    if cursor is not None and not cursor.isdigit():
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    since_value = parse_since(since) if since else None
     
     try:
-        # Get today's date
-        today = datetime.now().strftime("%Y-%m-%d")
-        
-        # Query students who checked in today
-        cursor.execute("""
-            SELECT student_id, name, class, major, avatar, attendance_time, checkin_face
-            FROM students 
-            WHERE attendance_time IS NOT NULL 
-            AND DATE(attendance_time) = ?
-            ORDER BY attendance_time DESC
-        """, (today,))
-        
-        students = cursor.fetchall()
-        
-        # Convert data
-        attendance_list = []
-        for student in students:
-            attendance_list.append(create_student_attendance(
-                student["student_id"],
-                student["name"],
-                student["class"],
-                student["major"],
-                blob_to_base64(student["avatar"]),
-                student["attendance_time"],
-                blob_to_base64(student["checkin_face"]) if student["checkin_face"] else ""
-            ))
-        
-        return create_today_checkins_response(
-            True,
-            attendance_list,
-            len(attendance_list)
-        )
+        # Served from the in-memory view of today
+        view = await today_view.current()
+        body = view.page(limit, int(cursor) if cursor is not None else None, selected, since_value)
+        return Response(content=body, media_type="application/json")
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
-    finally:
-        conn.close()
 
 @app.websocket("/ws/attendance")
 async def websocket_endpoint(websocket: WebSocket):
@@ -241,46 +436,169 @@ async def websocket_endpoint(websocket: WebSocket):
     finally:
         disconnect_websocket(websocket)
 
-@app.post("/notify-attendance")
-async def notify_attendance(student_id: str, attendance_time: str):
-    """API for recognition system to send new attendance information"""
-    conn = get_db()
+def load_checkin(conn: sqlite3.Connection, student_id: str, attendance_time: str, event_id: Optional[int]):
+    """(student row, check-in row with every CHECKIN_FIELDS field or None) of one check-in"""
     cursor = conn.cursor()
+    cursor.execute("""
+        SELECT student_id, name, class, major, avatar_version
+        FROM students 
+        WHERE student_id = ?
+    """, (student_id,))
+    student = cursor.fetchone()
+    if not student:
+        return None, None
     
-    try:
-        # Get student information
+    # Older writers don't send event_id, so fall back to the time
+    if event_id is None:
         cursor.execute("""
-            SELECT student_id, name, class, major, avatar, attendance_time, checkin_face
-            FROM students 
-            WHERE student_id = ?
-        """, (student_id,))
-        
-        student = cursor.fetchone()
+            SELECT id FROM attendance_events
+            WHERE student_id = ? AND attendance_time = ?
+            ORDER BY id DESC LIMIT 1
+        """, (student_id, attendance_time))
+        event = cursor.fetchone()
+        if not event:
+            return student, None
+        event_id = event["id"]
+    cursor.execute(f"""
+        SELECT {checkin_columns()}
+        FROM attendance_events AS latest
+        JOIN students s ON s.student_id = latest.student_id
+        WHERE latest.id = ? AND latest.student_id = ?
+    """, (event_id, student_id))
+    return student, cursor.fetchone()
+
+@app.post("/notify-attendance")
+async def notify_attendance(student_id: str, attendance_time: str, event_id: Optional[int] = None):
+    """API for recognition system to send new attendance information"""
+    try:
+        student, checkin = await db_pool.run(load_checkin, student_id, attendance_time, event_id)
         
         if not student:
             raise HTTPException(status_code=404, detail="Student does not exist")
         
+        if checkin:
+            attendance = create_student_attendance(checkin, list(CHECKIN_FIELDS))
+            today_view.add(attendance)
+        else:
+            # Check-in missing from the log; send what is known and let the view reload
+            attendance = {
+                "event_id": None,
+                "student_id": student["student_id"],
+                "name": student["name"],
+                "class_name": student["class"],
+                "major": student["major"],
+                "attendance_time": attendance_time,
+                "camera_id": None,
+                "confidence": None,
+                "avatar_url": avatar_url(student["student_id"], student["avatar_version"]) if student["avatar_version"] else "",
+                "checkin_face_url": ""
+            }
+            today_view.invalidate()
+        
         # Create information to send via WebSocket
-        attendance_data = {
-            "student_id": student["student_id"],
-            "name": student["name"],
-            "class_name": student["class"],
-            "major": student["major"],
-            "avatar_base64": blob_to_base64(student["avatar"]),
-            "attendance_time": attendance_time,
-            "checkin_face_base64": blob_to_base64(student["checkin_face"]) if student["checkin_face"] else "",
-            "timestamp": datetime.now().isoformat()
-        }
+        attendance_data = {**attendance, "timestamp": datetime.now().isoformat()}
         
         # Send information via WebSocket
         await broadcast_message(json.dumps(attendance_data))
         
         return {"success": True, "message": "Attendance information sent"}
         
+    except HTTPException:
+        raise  # 404 must reach the writer as is, it deletes the notification instead of retrying
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
+
+# Images as raw JPEG bytes, cacheable by the browser instead of base64 inside JSON
+AVATAR_CACHE_CONTROL = "public, max-age=31536000, immutable"  # avatar_url changes with the avatar's content version
+CHECKIN_FACE_CACHE_CONTROL = "public, max-age=31536000, immutable"  # Check-in events are never changed
+
+def image_response(request: Request, data: bytes, cache_control: str) -> Response:
+    """Image bytes with a strong ETag, or 304 when the browser already has them"""
+    etag = f'"{hashlib.sha256(data).hexdigest()[:32]}"'
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in [tag.strip() for tag in if_none_match.split(",")] or if_none_match.strip() == "*":
+        return Response(status_code=304, headers=headers)
+    media_type = "image/png" if data[:8] == b"\x89PNG\r\n\x1a\n" else "image/jpeg"
+    return Response(content=data, media_type=media_type, headers=headers)
+
+@app.get("/students/{student_id}/avatar")
+async def get_student_avatar(student_id: str, request: Request, size: str = "thumb"):
+    """API to get a student's avatar: thumb (dashboard list) or full (kiosk size)"""
+    if size not in ("thumb", "full"):
+        raise HTTPException(status_code=400, detail="size must be thumb or full")
+    column = "avatar_thumb" if size == "thumb" else "avatar"
+    row = await db_pool.fetchone(f"SELECT {column} AS image FROM students WHERE student_id = ?", (student_id,))
+    if not row or not row["image"]:
+        raise HTTPException(status_code=404, detail="Avatar not found")
+    return image_response(request, row["image"], AVATAR_CACHE_CONTROL)
+
+@app.get("/checkins/{event_id}/face")
+async def get_checkin_face(event_id: int, request: Request):
+    """API to get the face photo taken at one check-in"""
+    row = await db_pool.fetchone("SELECT image FROM checkin_faces WHERE event_id = ?", (event_id,))
+    if not row:
+        raise HTTPException(status_code=404, detail="Check-in face not found")
+    return image_response(request, row["image"], CHECKIN_FACE_CACHE_CONTROL)
+
+# Attendance history, read from the attendance_events log
+ATTENDANCE_EVENT_COLUMNS = """
+    e.id, e.student_id, s.name, s.class, s.major, e.attendance_time, e.camera_id, e.confidence,
+    EXISTS (SELECT 1 FROM checkin_faces f WHERE f.event_id = e.id) AS has_face
+"""
+
+@app.get("/attendance-events")
+async def get_attendance_events(period: str = "day", date: Optional[str] = None, student_id: Optional[str] = None):
+    """API to list check-ins of one day or one week (Monday to Sunday), optionally of one student"""
+    try:
+        day = datetime.strptime(date, "%Y-%m-%d").date() if date else datetime.now().date()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="date must be YYYY-MM-DD")
+    if period == "day":
+        start, end = time_range(day)
+    elif period == "week":
+        start, end = time_range(day - timedelta(days=day.weekday()), days=7)
+    else:
+        raise HTTPException(status_code=400, detail="period must be day or week")
+    
+    try:
+        # Range scan on idx_attendance_events_time, or on idx_attendance_events_student for one student
+        query = f"""
+            SELECT {ATTENDANCE_EVENT_COLUMNS}
+            FROM attendance_events e
+            JOIN students s ON s.student_id = e.student_id
+            WHERE e.attendance_time >= ? AND e.attendance_time < ?
+        """
+        params = [start, end]
+        if student_id:
+            query += " AND e.student_id = ?"
+            params.append(student_id)
+        rows = await db_pool.fetchall(query + " ORDER BY e.attendance_time DESC", params)
+        
+        events = [create_attendance_event(event) for event in rows]
+        return {"success": True, "start": start, "end": end, "data": events, "total": len(events)}
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
+
+@app.get("/students/{student_id}/attendance")
+async def get_student_attendance(student_id: str, limit: int = 100, before: Optional[str] = None):
+    """API to get the check-in history of one student, newest first; pass before= to page back"""
+    try:
+        rows = await db_pool.fetchall(f"""
+            SELECT {ATTENDANCE_EVENT_COLUMNS}
+            FROM attendance_events e
+            JOIN students s ON s.student_id = e.student_id
+            WHERE e.student_id = ? AND e.attendance_time < ?
+            ORDER BY e.attendance_time DESC
+            LIMIT ?
+        """, (student_id, before or "9999-12-31 23:59:59", max(1, min(limit, 1000))))
+        
+        events = [create_attendance_event(event) for event in rows]
+        return {"success": True, "data": events, "total": len(events)}
+        
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
-    finally:
-        conn.close()
 
 # Upload Excel file endpoint
 @app.post("/api/upload-excel")
@@ -321,7 +639,8 @@ async def upload_excel(file: UploadFile = File(...)):
 
 # Upload images folder endpoint
 @app.post("/api/upload-images")
-async def upload_images(files: List[UploadFile] = File(...)):
+async def upload_images(files: List[UploadFile] = File(...), enroll: bool = False):
+    """Save uploaded student images; with enroll=true each image is also enrolled as soon as it is saved"""
     try:
         # Create avatars directory if not exists
         avatars_dir = Path("../avatars")
@@ -345,8 +664,14 @@ async def upload_images(files: List[UploadFile] = File(...)):
                     
                     # Save image with original filename
                     image_path = student_dir / original_filename
+                    data = await file.read()
                     with open(image_path, "wb") as buffer:
-                        shutil.copyfileobj(file.file, buffer)
+                        buffer.write(data)
+                    
+                    # Decode, detect and embed in the background while the rest is still arriving;
+                    # a running process-data job picks the file up itself
+                    if enroll and not job_manager.is_active("process-data"):
+                        get_enroller().submit(student_id, str(image_path), data)
                     
                     uploaded_students.add(student_id)
                     total_files += 1
@@ -362,45 +687,72 @@ async def upload_images(files: List[UploadFile] = File(...)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error uploading images folder: {str(e)}")
 
+# Streaming enrollment of uploaded images
+enroller = None
+
+def get_enroller():
+    """Created on first use, so the API only loads FaceNet when streaming enrollment is used"""
+    global enroller
+    if enroller is None:
+        from enrollment_stream import StreamingEnroller
+        enroller = StreamingEnroller()
+    return enroller
+
+@app.get("/api/enrollment-stream")
+async def enrollment_stream_status():
+    """Progress of images uploaded with enroll=true"""
+    if enroller is None:
+        return {"success": True, "busy": False, "queued": 0, "enrolled": 0, "no_face": 0, "failed": 0}
+    return {"success": True, **enroller.status()}
+
+def start_job(kind: str, message: str) -> Dict[str, Any]:
+    """Start a background job, or fail with 409 while one of the same kind (or streaming enrollment) is running"""
+    if kind == "process-data" and enroller is not None and enroller.busy():
+        raise HTTPException(status_code=409, detail="Uploaded images are still being enrolled, wait for it to finish")
+    try:
+        job = job_manager.submit(kind)
+    except JobConflict as e:
+        raise HTTPException(status_code=409, detail=f"{str(e)}, wait for it to finish")
+    return {"success": True, "message": message, "job_id": job["job_id"], "job": job}
+
 # Process data endpoint
 @app.post("/api/process-data")
 async def process_data():
-    try:
-        # Import and run the data processing function
-        from data import process_face_data
-        
-        success = process_face_data()
-        
-        if not success:
-            raise HTTPException(status_code=500, detail="Data processing failed")
-        
-        return {
-            "success": True,
-            "message": "Data processing successful"
-        }
-        
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error processing data: {str(e)}")
+    """Start enrollment (images -> embeddings -> Qdrant) as a background job"""
+    return start_job("process-data", "Data processing started")
 
 # Update database endpoint
 @app.post("/api/update-database")
 async def update_database():
+    """Start the database update from students.xlsx as a background job"""
+    return start_job("update-database", "Database update started")
+
+@app.get("/api/jobs")
+async def list_jobs():
+    """Recent background jobs, newest first"""
+    return {"success": True, "data": job_manager.list_jobs()}
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Status and progress of one background job"""
+    job = job_manager.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job does not exist")
+    return {"success": True, "job": job}
+
+@app.websocket("/ws/jobs")
+async def jobs_websocket(websocket: WebSocket):
+    """WebSocket endpoint to push background job progress"""
+    await websocket.accept()
+    job_connections.append(websocket)
     try:
-        # Import and run the database update function
-        from database import update_database as update_db
-        
-        success = update_db()
-        
-        if not success:
-            raise HTTPException(status_code=500, detail="Database update failed")
-        
-        return {
-            "success": True,
-            "message": "Database updated successfully"
-        }
-        
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error updating database: {str(e)}")
+        while True:
+            await websocket.receive_text()
+    except Exception:
+        pass
+    finally:
+        if websocket in job_connections:
+            job_connections.remove(websocket)
 
 # Download sample Excel file
 @app.get("/sample-excel")
@@ -420,9 +772,12 @@ if __name__ == "__main__":
     print("   - WS /ws/attendance - WebSocket real-time")
     print("   - POST /notify-attendance - New attendance notification")
     print("   - POST /api/upload-excel - Upload student Excel file")
-    print("   - POST /api/upload-images - Upload student images folder")
-    print("   - POST /api/process-data - Process data from Excel and images")
-    print("   - POST /api/update-database - Update database from processed data")
+    print("   - POST /api/upload-images - Upload student images folder (?enroll=true to enroll while uploading)")
+    print("   - GET /api/enrollment-stream - Progress of images enrolled while uploading")
+    print("   - POST /api/process-data - Start processing data from Excel and images (background job)")
+    print("   - POST /api/update-database - Start updating database from processed data (background job)")
+    print("   - GET /api/jobs/{job_id} - Background job status and progress")
+    print("   - WS /ws/jobs - WebSocket background job progress")
     print("   - GET /sample-excel - Download sample Excel file")
     print("🌐 Server running on: http://localhost:8000")
     print("📖 API Docs: http://localhost:8000/docs")
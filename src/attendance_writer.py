@@ -0,0 +1,151 @@
+import queue
+import sqlite3
+import threading
+import cv2
+import requests
+from datetime import datetime
+from database import TIME_FORMAT, create_attendance_tables
+from db import DB_PATH, connect
+
+class AttendanceWriter:
+    """Write-behind attendance queue that keeps DB and HTTP work off the UI thread.
+
+    Check-ins are queued by submit() and appended to the attendance_events
+    log by a background thread, several per transaction. Each transaction
+    also records the matching /notify-attendance calls in a
+    pending_notifications table (a durable outbox), which a second thread
+    delivers through one requests.Session and retries with exponential
+    backoff, including after a restart.
+    """
+
+    def __init__(self, db_path=DB_PATH, notify_url="http://localhost:8000/notify-attendance",
+                 batch_size=50, timeout=5, min_backoff=1.0, max_backoff=60.0):
+        self.db_path = db_path
+        self.notify_url = notify_url
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+
+        self._queue = queue.Queue()
+        self._pending = {}  # student_id -> attendance_time not yet committed
+        self._pending_lock = threading.Lock()
+        self._notify_event = threading.Event()
+        self._stop_event = threading.Event()
+        self._session = requests.Session()
+        self._threads = []
+
+    def start(self):
+        conn = connect(self.db_path)
+        create_attendance_tables(conn)
+        conn.close()
+
+        for worker in (self._write_worker, self._notify_worker):
+            thread = threading.Thread(target=worker, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        self._notify_event.set()  # Deliver anything left over from the last run
+
+    def stop(self, timeout=5):
+        """Flush queued check-ins and stop both workers"""
+        self._stop_event.set()
+        self._notify_event.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def submit(self, student_id, face_image=None, camera_id=None, confidence=None):
+        """Queue a check-in and return its attendance time immediately"""
+        attendance_time = datetime.now().strftime(TIME_FORMAT)
+        with self._pending_lock:
+            self._pending[student_id] = attendance_time
+        self._queue.put((student_id, attendance_time, face_image,
+                         None if camera_id is None else str(camera_id), confidence))
+        return attendance_time
+
+    def pending_time(self, student_id):
+        """Attendance time of a check-in that is queued but not yet committed"""
+        with self._pending_lock:
+            return self._pending.get(student_id)
+
+    def _next_batch(self):
+        try:
+            batch = [self._queue.get(timeout=0.5)]
+        except queue.Empty:
+            return []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write_worker(self):
+        conn = connect(self.db_path)
+        while not (self._stop_event.is_set() and self._queue.empty()):
+            batch = self._next_batch()
+            if not batch:
+                continue
+
+            try:
+                with conn:
+                    for student_id, attendance_time, face_image, camera_id, confidence in batch:
+                        cursor = conn.execute(
+                            "INSERT INTO attendance_events (student_id, attendance_time, camera_id, confidence) VALUES (?, ?, ?, ?)",
+                            (student_id, attendance_time, camera_id, confidence)
+                        )
+                        event_id = cursor.lastrowid
+                        if face_image is not None:
+                            # Convert image to bytes
+                            _, buffer = cv2.imencode('.jpg', face_image)
+                            conn.execute("INSERT INTO checkin_faces (event_id, image) VALUES (?, ?)", (event_id, buffer.tobytes()))
+                        conn.execute(
+                            "INSERT INTO pending_notifications (student_id, attendance_time, event_id) VALUES (?, ?, ?)",
+                            (student_id, attendance_time, event_id)
+                        )
+                print(f"✅ Saved {len(batch)} attendance record(s)")
+            except sqlite3.Error as e:
+                print(f"❌ Error saving attendance: {e}")
+            finally:
+                with self._pending_lock:
+                    for student_id, attendance_time, *_ in batch:
+                        if self._pending.get(student_id) == attendance_time:
+                            del self._pending[student_id]
+            self._notify_event.set()
+        conn.close()
+
+    def _notify_worker(self):
+        conn = connect(self.db_path)
+        backoff = self.min_backoff
+        while not self._stop_event.is_set():
+            self._notify_event.wait()
+            self._notify_event.clear()
+
+            rows = conn.execute(
+                "SELECT id, student_id, attendance_time, event_id FROM pending_notifications ORDER BY id"
+            ).fetchall()
+            for row_id, student_id, attendance_time, event_id in rows:
+                # Send notification to API backend
+                try:
+                    response = self._session.post(
+                        self.notify_url,
+                        params={"student_id": student_id, "attendance_time": attendance_time, "event_id": event_id},
+                        timeout=self.timeout
+                    )
+                    if response.status_code >= 500:
+                        # A transient API fault such as a locked database, keep the row and back off
+                        raise requests.exceptions.HTTPError(f"API answered {response.status_code}", response=response)
+                    if response.ok:
+                        print(f"✅ Sent attendance notification for {student_id}")
+                    else:
+                        # Rejected (unknown student, bad request), retrying the same request will not help
+                        print(f"⚠️ Notification rejected: {response.status_code}")
+                    with conn:
+                        conn.execute("DELETE FROM pending_notifications WHERE id = ?", (row_id,))
+                    backoff = self.min_backoff
+                except requests.exceptions.RequestException as e:
+                    print(f"⚠️ Notification failed, retrying in {backoff:g}s: {e}")
+                    if not self._stop_event.wait(backoff):
+                        self._notify_event.set()
+                    backoff = min(backoff * 2, self.max_backoff)
+                    break
+        conn.close()
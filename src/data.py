@@ -1,106 +1,302 @@
 import os
 import cv2
-import numpy as np
-import torch
-from facenet_pytorch import InceptionResnetV1
+import json
+import uuid
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
 from qdrant_client import QdrantClient
-from qdrant_client.models import Distance, VectorParams, PointStruct
+from qdrant_client.models import PointStruct, PointIdsList
 import sys
+from embedding import get_face_embeddings, model_version
+from embedding_store import EmbeddingStore
+from prototypes import PROTOTYPE_METHODS, build_prototypes
+from ann_index import ANN_KIND, INDEX_TYPES, build_from_store, index_path
+from qdrant_versions import create_version, drop_alias, publish_version
 
-def process_face_data():
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+MANIFEST_PATH = "enrollment_manifest.json"  # image_path -> {"hash", "student_id", "point_id"} of enrolled images
+POINT_NAMESPACE = uuid.UUID("6f1c2a53-3d0e-4c43-9a6e-1d2f0b7f5e21")
+PROTOTYPES = os.environ.get("FACE_PROTOTYPES") or None  # None, "mean" or "medoids"
+PROTOTYPE_K = int(os.environ.get("FACE_PROTOTYPE_K", "3"))
+face_cascade = None  # Loaded once per worker process
+
+def _init_worker():
+    global face_cascade
+    cv2.setNumThreads(1)  # Parallelism comes from the process pool
+    face_cascade = cv2.CascadeClassifier('haarcascade_frontalface_default.xml')
+
+def crop_face(img, cascade):
+    """160x160 crop of the first face in a BGR image, or None"""
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+
+    # Detect faces
+    faces = cascade.detectMultiScale(gray, 1.3, 5)
+    if len(faces) == 0:
+        return None
+
+    x, y, w, h = faces[0]
+    return cv2.resize(img[y:y+h, x:x+w], (160, 160))
+
+def detect_face(image_path):
+    """Decode an image and return (image_path, 160x160 face crop or None, error message)"""
     try:
-        # Load model FaceNet PyTorch
-        device = torch.device('cpu')
-        model = InceptionResnetV1(pretrained='vggface2').eval().to(device)
+        # Load image
+        img = cv2.imread(image_path)
+        if img is None:
+            return image_path, None, "Unable to read image"
 
-        # Connect to Qdrant
-        client = QdrantClient(host="localhost", port=6333)
+        face_img = crop_face(img, face_cascade)
+        if face_img is None:
+            return image_path, None, "No face found"
+        return image_path, face_img, None
+    except Exception as e:
+        return image_path, None, str(e)
 
-        # Create collection
-        collection_name = "faces"
-        client.recreate_collection(
-            collection_name=collection_name,
-            vectors_config=VectorParams(size=512, distance=Distance.COSINE)
+def hash_image(image_path):
+    """SHA-256 of the image file content"""
+    with open(image_path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def point_id_for(student_id, image_hash):
+    """Stable Qdrant point ID, so re-enrolling the same image is idempotent"""
+    return str(uuid.uuid5(POINT_NAMESPACE, f"{student_id}:{image_hash}"))
+
+def load_manifest(path=MANIFEST_PATH):
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"⚠️ Ignoring unreadable manifest {path}: {e}")
+        return {}
+
+def save_manifest(manifest, path=MANIFEST_PATH):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+def update_prototypes(client, collection_name, store, method, k=PROTOTYPE_K):
+    """Publish a new version of <collection>_prototypes with per-student prototypes of the stored embeddings"""
+    prototype_collection = f"{collection_name}_prototypes"
+    if method is None:
+        # Prototypes of an older enrollment would hide new students from recognition
+        if client.collection_exists(prototype_collection):
+            drop_alias(client, prototype_collection)
+            print(f"🗑️ Removed {prototype_collection}")
+        return
+
+    vectors, student_ids = store.student_matrix()
+    prototypes, prototype_ids = build_prototypes(vectors, student_ids, method, k)
+    version = create_version(client, prototype_collection)
+    points = [
+        PointStruct(
+            id=str(uuid.uuid5(POINT_NAMESPACE, f"prototype:{student_id}:{i}")),
+            vector=prototype.tolist(),
+            payload={"student_id": student_id, "method": method}
         )
+        for i, (prototype, student_id) in enumerate(zip(prototypes, prototype_ids))
+    ]
+    for start in range(0, len(points), 256):
+        client.upsert(collection_name=version, points=points[start:start + 256])
+    publish_version(client, prototype_collection, version)
+    print(f"📊 Built {len(points)} {method} prototypes for {len(set(prototype_ids))} students from {len(vectors)} vectors")
+
+def update_ann_index(store, kind):
+    """Rebuild the local ANN index of the store, or remove stale ones when kind is None"""
+    if kind is not None:
+        build_from_store(store, kind)
+    for other in INDEX_TYPES:
+        path = index_path(store, other)
+        if other != kind and os.path.exists(path):
+            os.remove(path)
+            print(f"🗑️ Removed {path}")
+
+def list_images(images_path):
+    """(student_id, image_path) for every image under images_path/<student_id>/"""
+    images = []
+    for person_name in sorted(os.listdir(images_path)):
+        person_path = os.path.join(images_path, person_name)
+        if os.path.isdir(person_path):
+            for image_file in sorted(os.listdir(person_path)):
+                if image_file.lower().endswith(IMAGE_EXTENSIONS):
+                    images.append((person_name, os.path.join(person_path, image_file)))
+    return images
+
+def process_face_data(progress=None, workers=None, embed_batch_size=64, upsert_batch_size=256, full_rebuild=False,
+                      prototypes=PROTOTYPES, prototype_k=PROTOTYPE_K, ann=ANN_KIND):
+    """Bring the Qdrant faces collection in line with the images under ../avatars.
+
+    Enrollment is incremental: a manifest of image content hashes records
+    what is already in Qdrant, so only new or changed images are embedded
+    and points of deleted or changed images are removed. Point IDs are
+    derived from student_id and image hash, so re-runs are idempotent.
+    When the collection doesn't match the manifest (or full_rebuild is set)
+    every image is upserted into a new faces_v<N> collection, and the faces
+    alias is switched to it only once it is complete, so recognizers keep
+    matching against the previous version during the rebuild.
 
-        # Load face detector
-        face_cascade = cv2.CascadeClassifier('haarcascade_frontalface_default.xml')
+    Embeddings are also kept in the local EmbeddingStore of the current
+    model version, keyed by image hash, so images seen before (including
+    after a collection rebuild) are upserted without detection or FaceNet.
 
-        def get_face_embedding(face_img):
-            face_img = cv2.resize(face_img, (160, 160))
-            face_img = cv2.cvtColor(face_img, cv2.COLOR_BGR2RGB)
-            face_img = face_img / 255.0
-            face_img = torch.tensor(face_img, dtype=torch.float32).permute(2, 0, 1).unsqueeze(0)
-            with torch.no_grad():
-                embedding = model(face_img.to(device)).cpu().numpy()[0]
-            return embedding / np.linalg.norm(embedding)
+    Images are decoded and face-detected in a process pool, face crops are
+    embedded in batches of embed_batch_size and points are upserted in
+    chunks of upsert_batch_size. progress(done, total) is called after
+    each embedded batch.
+
+    With prototypes set to "mean" or "medoids", one mean vector or up to
+    prototype_k medoids per student are also written to the
+    <collection>_prototypes collection, which recognition matches first.
+    With ann set to "ivf" (or "exact"), a local ANN index file is built
+    from the embedding store and its recall against exact search printed.
+    """
+    try:
+        # Connect to Qdrant
+        client = QdrantClient(host="localhost", port=6333)
 
         # Images folder path
         images_path = "../avatars"
-        point_id = 1
 
         if not os.path.exists(images_path):
             print(f"❌ Image folder not found: {images_path}")
             return False
 
-        # Loop through subfolders (person names)
-        for person_name in os.listdir(images_path):
-            person_path = os.path.join(images_path, person_name)
-            
-            if os.path.isdir(person_path):
-                print(f"📸 Processing: {person_name}")
-                
-                processed_images = 0
-                for image_file in os.listdir(person_path):
-                    if image_file.lower().endswith(('.png', '.jpg', '.jpeg')):
-                        image_path = os.path.join(person_path, image_file)
-                        
-                        try:
-                            # Load image
-                            img = cv2.imread(image_path)
-                            if img is None:
-                                print(f"⚠️ Unable to read image: {image_path}")
-                                continue
-                                
-                            gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-                            
-                            # Detect faces
-                            faces = face_cascade.detectMultiScale(gray, 1.3, 5)
-                            
-                            if len(faces) > 0:
-                                x, y, w, h = faces[0]
-                                face_img = img[y:y+h, x:x+w]
-                                
-                                # Generate embedding
-                                embedding = get_face_embedding(face_img)
-                                
-                                # Add to Qdrant
-                                client.upsert(
-                                    collection_name=collection_name,
-                                    points=[PointStruct(
-                                        id=point_id,
-                                        vector=embedding.tolist(),
-                                        payload={"student_id": person_name, "image_path": image_path}
-                                    )]
-                                )
-                                
-                                print(f"✅ Added: {image_file}")
-                                processed_images += 1
-                                point_id += 1
-                            else:
-                                print(f"⚠️ No face found in: {image_file}")
-                        except Exception as e:
-                            print(f"❌ Error processing image {image_file}: {str(e)}")
-                
-                print(f"📊 Processed {processed_images} images for {person_name}")
+        # Update the live collection in place, or build a new version when it no longer matches the manifest
+        collection_name = "faces"
+        target = collection_name
+        manifest = {} if full_rebuild else load_manifest()
+        enrolled = len({entry["point_id"] for entry in manifest.values() if entry.get("point_id")})
+        if (full_rebuild or not client.collection_exists(collection_name) or
+                client.count(collection_name=collection_name, exact=True).count != enrolled):
+            manifest = {}
+            target = create_version(client, collection_name)
+            print(f"🔄 Rebuilding faces collection into {target}")
+
+        store = EmbeddingStore.open(model_version())
+        images = list_images(images_path)
+        student_of = {image_path: student_id for student_id, image_path in images}
+
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+            paths = [image_path for _, image_path in images]
+            hashes = dict(zip(paths, executor.map(hash_image, paths, chunksize=64)))
+
+            # Points of deleted or changed images
+            stale_ids = []
+            for image_path, entry in list(manifest.items()):
+                if hashes.get(image_path) != entry["hash"] or student_of.get(image_path) != entry["student_id"]:
+                    if entry.get("point_id"):
+                        stale_ids.append(entry["point_id"])
+                    del manifest[image_path]
+            # Identical copies of an image share a point; keep it while any copy remains
+            live_ids = {entry["point_id"] for entry in manifest.values()}
+            stale_ids = [point_id for point_id in set(stale_ids) if point_id not in live_ids]
+            if stale_ids:
+                client.delete(collection_name=target, points_selector=PointIdsList(points=stale_ids))
+            print(f"🗑️ Removed {len(stale_ids)} vectors of deleted or changed images")
+
+            # Only new or changed images need upserting, and only those not in the store need FaceNet
+            todo = [image_path for image_path in paths if image_path not in manifest]
+            cached = [image_path for image_path in todo if store.get(hashes[image_path]) is not None]
+            to_embed = [image_path for image_path in todo if store.get(hashes[image_path]) is None]
+            total = len(todo)
+            print(f"📸 Processing {total} new or changed images of {len(paths)} "
+                  f"({len(cached)} from the embedding store) with {workers or os.cpu_count()} workers")
+
+            done = 0
+            processed_per_student = {}
+            face_batch = []
+            pending_points = []
+
+            def add_point(image_path, embedding):
+                student_id = student_of[image_path]
+                image_hash = hashes[image_path]
+                pending_points.append((image_path, PointStruct(
+                    id=point_id_for(student_id, image_hash),
+                    vector=embedding.tolist(),
+                    payload={"student_id": student_id, "image_path": image_path, "image_hash": image_hash}
+                )))
+                processed_per_student[student_id] = processed_per_student.get(student_id, 0) + 1
+                if len(pending_points) >= upsert_batch_size:
+                    flush_points()
+
+            def flush_faces():
+                if not face_batch:
+                    return
+                # Generate embeddings for the whole batch in one forward pass
+                embeddings = get_face_embeddings([face_img for _, face_img in face_batch])
+                for (image_path, _), embedding in zip(face_batch, embeddings):
+                    store.put(hashes[image_path], embedding, student_of[image_path], image_path)
+                    add_point(image_path, embedding)
+                face_batch.clear()
+
+            def flush_points():
+                # Add to Qdrant, then record in the manifest
+                for start in range(0, len(pending_points), upsert_batch_size):
+                    chunk = pending_points[start:start + upsert_batch_size]
+                    client.upsert(collection_name=target, points=[point for _, point in chunk])
+                    for image_path, point in chunk:
+                        manifest[image_path] = {"hash": hashes[image_path], "student_id": student_of[image_path], "point_id": point.id}
+                pending_points.clear()
+
+            for image_path in cached:
+                done += 1
+                add_point(image_path, store.get(hashes[image_path]))
+            if cached and progress:
+                progress(done, total)
+
+            for image_path, face_img, error in executor.map(detect_face, to_embed, chunksize=16):
+                done += 1
+                if error:
+                    print(f"⚠️ {error}: {image_path}")
+                    # Remember images without a usable face so they aren't retried until they change
+                    manifest[image_path] = {"hash": hashes[image_path], "student_id": student_of[image_path], "point_id": None}
+                else:
+                    face_batch.append((image_path, face_img))
+                if len(face_batch) >= embed_batch_size:
+                    flush_faces()
+                    if progress:
+                        progress(done, total)
+
+            flush_faces()
+            flush_points()
+            if progress:
+                progress(total, total)
+
+        if target != collection_name:
+            publish_version(client, collection_name, target)
+        save_manifest(manifest)
+        # Keep the store in line with what is enrolled, so recognizers can warm-start from it
+        store.save(keep=[(entry["hash"], entry["student_id"], image_path)
+                         for image_path, entry in sorted(manifest.items()) if entry.get("point_id")])
+        print(f"💾 Saved {len(store)} embeddings to {store.vectors_path}")
+        update_prototypes(client, collection_name, store, prototypes, prototype_k)
+        update_ann_index(store, ann)
+
+        for student_id in sorted(processed_per_student):
+            print(f"📊 Processed {processed_per_student[student_id]} images for {student_id}")
 
         print("🎉 Data processing completed!")
         return True
-        
+
     except Exception as e:
         print(f"❌ Error processing data: {str(e)}")
         return False
 
 if __name__ == "__main__":
-    success = process_face_data()
+    prototypes = PROTOTYPES
+    for method in PROTOTYPE_METHODS:
+        if f"--prototypes={method}" in sys.argv:
+            prototypes = method
+    ann = ANN_KIND
+    for kind in INDEX_TYPES:
+        if f"--ann={kind}" in sys.argv:
+            ann = kind
+    success = process_face_data(
+        progress=lambda done, total: print(f"⏳ {done}/{total} images"),
+        full_rebuild="--full" in sys.argv,
+        prototypes=prototypes,
+        ann=ann
+    )
     sys.exit(0 if success else 1)
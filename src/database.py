@@ -1,54 +1,276 @@
 import sqlite3
-import pandas as pd
+import cv2
+import numpy as np
 import os
-from glob import glob
 import hashlib
 import sys
+import zipfile
+from datetime import datetime, timedelta
+from openpyxl import load_workbook
+from db import DB_PATH, connect
+from openpyxl.utils.exceptions import InvalidFileException
 
-def update_database():
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+ROSTER_COLUMNS = ("student_id", "name", "class", "major")
+BATCH_SIZE = 1000  # Rows per executemany, bounds memory spent on avatar blobs
+MAX_REPORTED_ERRORS = 50
+# Avatar column -> longest side in pixels. avatar is read by the 200x200 kiosk panel in
+# main.py, avatar_thumb by the dashboard list (120x160 cells)
+AVATAR_SIZES = {"avatar": 200, "avatar_thumb": 160}
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"  # attendance_time, sorts and compares as text
+
+def make_thumbnail(img, size, quality=80):
+    """JPEG of a decoded BGR image scaled down so its longest side is size"""
+    scale = size / max(img.shape[:2])
+    if scale < 1:
+        img = cv2.resize(img, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    ok, buffer = cv2.imencode('.jpg', img, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    return buffer.tobytes() if ok else None
+
+def avatar_version(avatar, avatar_thumb):
+    """Short content hash of a student's avatars; it is part of their URL, so browsers can cache them for good"""
+    return hashlib.sha256((avatar or b"") + (avatar_thumb or b"")).hexdigest()[:12]
+
+def make_avatars(image_data):
+    """(avatar, avatar_thumb, avatar_version) of one encoded image, or None if it can't be decoded"""
+    if not image_data:
+        return None
     try:
-        # Connect to SQLite
-        conn = sqlite3.connect("students.db")
-        cursor = conn.cursor()
+        img = cv2.imdecode(np.frombuffer(image_data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    except cv2.error:
+        return None  # Corrupt data can trip OpenCV's decoder asserts instead of returning None
+    if img is None:
+        return None
+    thumbnails = []
+    for size in AVATAR_SIZES.values():
+        if max(img.shape[:2]) <= size and image_data[:2] == b"\xff\xd8":
+            thumbnails.append(bytes(image_data))  # Already a small JPEG, re-encoding would only grow it
+        else:
+            thumbnails.append(make_thumbnail(img, size))
+    if None in thumbnails:
+        return None
+    return tuple(thumbnails) + (avatar_version(*thumbnails),)
 
-        # Create students table if not exists
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS students (
-            student_id TEXT PRIMARY KEY,
-            name TEXT,
-            class TEXT,
-            major TEXT,
-            avatar BLOB,
-            attendance_time TEXT,
-            checkin_face BLOB
-        )
-        """)
+def migrate_avatars(conn, batch_size=500):
+    """Replace full-size avatars of rows imported before thumbnails existed, and version older thumbnails"""
+    rows = conn.execute("SELECT student_id FROM students WHERE avatar IS NOT NULL AND avatar_thumb IS NULL").fetchall()
+    for start in range(0, len(rows), batch_size):
+        updates = []
+        for (student_id,) in rows[start:start + batch_size]:
+            (avatar,) = conn.execute("SELECT avatar FROM students WHERE student_id = ?", (student_id,)).fetchone()
+            avatars = make_avatars(avatar)
+            if avatars:
+                updates.append(avatars + (student_id,))
+        conn.executemany("UPDATE students SET avatar = ?, avatar_thumb = ?, avatar_version = ? WHERE student_id = ?", updates)
+    if rows:
+        print(f"✅ Generated avatar thumbnails for {len(rows)} existing students")
 
-        # Create teacher table if not exists
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS teacher (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT UNIQUE NOT NULL,
-            password_hash TEXT NOT NULL,
-            full_name TEXT
-        )
+    # Thumbnails made before avatar_version existed
+    rows = conn.execute("SELECT student_id FROM students WHERE avatar_thumb IS NOT NULL AND avatar_version IS NULL").fetchall()
+    for start in range(0, len(rows), batch_size):
+        updates = []
+        for (student_id,) in rows[start:start + batch_size]:
+            avatar, avatar_thumb = conn.execute("SELECT avatar, avatar_thumb FROM students WHERE student_id = ?", (student_id,)).fetchone()
+            updates.append((avatar_version(avatar, avatar_thumb), student_id))
+        conn.executemany("UPDATE students SET avatar_version = ? WHERE student_id = ?", updates)
+
+def create_attendance_tables(conn):
+    """Create the attendance event log and notification outbox, seeding the log from students.attendance_time once"""
+    seeded = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'attendance_events'").fetchone()
+
+    # One row per check-in, never updated. Times are "%Y-%m-%d %H:%M:%S" text, so a day
+    # or week is a plain range on attendance_time that both indexes below can serve
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS attendance_events (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        student_id TEXT NOT NULL,
+        attendance_time TEXT NOT NULL,
+        camera_id TEXT,
+        confidence REAL
+    )
+    """)
+    # Check-in face photos live apart from the events so range scans never read them
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS checkin_faces (
+        event_id INTEGER PRIMARY KEY REFERENCES attendance_events(id),
+        image BLOB NOT NULL
+    )
+    """)
+    # Covering indexes: date-range lists and per-student history are answered from the index alone
+    conn.execute("""
+    CREATE INDEX IF NOT EXISTS idx_attendance_events_time
+    ON attendance_events (attendance_time, student_id, camera_id, confidence)
+    """)
+    conn.execute("""
+    CREATE INDEX IF NOT EXISTS idx_attendance_events_student
+    ON attendance_events (student_id, attendance_time, camera_id, confidence)
+    """)
+
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS pending_notifications (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        student_id TEXT NOT NULL,
+        attendance_time TEXT NOT NULL
+    )
+    """)
+    try:
+        conn.execute("ALTER TABLE pending_notifications ADD COLUMN event_id INTEGER")
+    except sqlite3.OperationalError:
+        pass  # Column already exists
+
+    if not seeded:
+        # Latest check-in of each student, as recorded before the event log existed
+        conn.execute("""
+            INSERT INTO attendance_events (student_id, attendance_time)
+            SELECT student_id, attendance_time FROM students
+            WHERE attendance_time IS NOT NULL ORDER BY attendance_time
+        """)
+        conn.execute("""
+            INSERT INTO checkin_faces (event_id, image)
+            SELECT e.id, s.checkin_face FROM attendance_events e
+            JOIN students s ON s.student_id = e.student_id
+            WHERE s.checkin_face IS NOT NULL
         """)
+        print("✅ Created attendance_events table")
+    conn.commit()
 
-        # Add attendance_time column if not exists
-        try:
-            cursor.execute("ALTER TABLE students ADD COLUMN attendance_time TEXT")
-            print("✅ Added attendance_time column")
-        except sqlite3.OperationalError:
-            print("ℹ️ attendance_time column already exists")
+def roster_version(conn):
+    """Counter bumped by every roster import, so long-running readers know when to drop cached profiles"""
+    try:
+        row = conn.execute("SELECT version FROM roster_version").fetchone()
+    except sqlite3.OperationalError:
+        return 0  # Database from before the counter existed
+    return row[0] if row else 0
 
-        # Add checkin_face column if not exists
-        try:
-            cursor.execute("ALTER TABLE students ADD COLUMN checkin_face BLOB")
-            print("✅ Added checkin_face column")
-        except sqlite3.OperationalError:
-            print("ℹ️ checkin_face column already exists")
+def time_range(start, days=1):
+    """(from, to) attendance_time bounds covering days whole days starting at the date start"""
+    start = datetime.combine(start, datetime.min.time())
+    return start.strftime(TIME_FORMAT), (start + timedelta(days=days)).strftime(TIME_FORMAT)
 
-        conn.commit()
+def _cell(value):
+    """Excel cell as text; whole numbers read as floats lose their .0"""
+    if value is None:
+        return None
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    value = str(value).strip()
+    return value or None
+
+def _roster_rows(rows):
+    """Yield (row number, {column: value}) from sheet rows whose first row is the header"""
+    header = [_cell(value) for value in next(rows, ())]
+    missing = [column for column in ROSTER_COLUMNS if column not in header]
+    if missing:
+        raise ValueError(f"Excel file missing columns: {', '.join(missing)}")
+    positions = {column: header.index(column) for column in ROSTER_COLUMNS}
+    for row_number, values in enumerate(rows, start=2):
+        if not any(value is not None for value in values):
+            continue  # Trailing empty rows
+        yield row_number, {column: _cell(values[i]) if i < len(values) else None for column, i in positions.items()}
+
+def read_roster(excel_file):
+    """Yield (row number, {column: value}) for every data row, streaming the sheet"""
+    try:
+        workbook = load_workbook(excel_file, read_only=True, data_only=True)
+    except (InvalidFileException, zipfile.BadZipFile):
+        # Legacy .xls content saved under the .xlsx name; openpyxl fails to open it as a zip
+        import pandas as pd
+        sheet = pd.read_excel(excel_file, header=None)
+        # Blank cells come back as NaN, make them None like openpyxl does
+        yield from _roster_rows(tuple(None if pd.isna(value) else value for value in values)
+                                for values in sheet.itertuples(index=False, name=None))
+        return
+
+    try:
+        yield from _roster_rows(workbook.active.iter_rows(values_only=True))
+    finally:
+        workbook.close()
+
+def scan_avatars(avatars_dir):
+    """Map student_id -> first image in avatars_dir/<student_id>/, from one pass over the folder"""
+    avatars = {}
+    if not os.path.isdir(avatars_dir):
+        return avatars
+    with os.scandir(avatars_dir) as students:
+        for student in students:
+            if not student.is_dir():
+                continue
+            images = sorted(entry.name for entry in os.scandir(student.path)
+                            if entry.is_file() and entry.name.lower().endswith(IMAGE_EXTENSIONS))
+            if images:
+                avatars[student.name] = os.path.join(student.path, images[0])
+    return avatars
+
+def migrate_schema(conn):
+    """Create tables and add columns missing from databases made by older versions"""
+    cursor = conn.cursor()
+
+    # Create students table if not exists
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS students (
+        student_id TEXT PRIMARY KEY,
+        name TEXT,
+        class TEXT,
+        major TEXT,
+        avatar BLOB,
+        attendance_time TEXT,
+        checkin_face BLOB,
+        avatar_thumb BLOB
+    )
+    """)
+
+    # Create teacher table if not exists
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS teacher (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT UNIQUE NOT NULL,
+        password_hash TEXT NOT NULL,
+        full_name TEXT
+    )
+    """)
+
+    # Add attendance_time column if not exists
+    try:
+        cursor.execute("ALTER TABLE students ADD COLUMN attendance_time TEXT")
+        print("✅ Added attendance_time column")
+    except sqlite3.OperationalError:
+        print("ℹ️ attendance_time column already exists")
+
+    # Add checkin_face column if not exists
+    try:
+        cursor.execute("ALTER TABLE students ADD COLUMN checkin_face BLOB")
+        print("✅ Added checkin_face column")
+    except sqlite3.OperationalError:
+        print("ℹ️ checkin_face column already exists")
+
+    # Add avatar_thumb column if not exists
+    try:
+        cursor.execute("ALTER TABLE students ADD COLUMN avatar_thumb BLOB")
+        print("✅ Added avatar_thumb column")
+    except sqlite3.OperationalError:
+        print("ℹ️ avatar_thumb column already exists")
+
+    # Add avatar_version column if not exists
+    try:
+        cursor.execute("ALTER TABLE students ADD COLUMN avatar_version TEXT")
+        print("✅ Added avatar_version column")
+    except sqlite3.OperationalError:
+        print("ℹ️ avatar_version column already exists")
+    migrate_avatars(conn)
+    create_attendance_tables(conn)
+
+    cursor.execute("CREATE TABLE IF NOT EXISTS roster_version (version INTEGER NOT NULL)")
+    if cursor.execute("SELECT COUNT(*) FROM roster_version").fetchone()[0] == 0:
+        cursor.execute("INSERT INTO roster_version (version) VALUES (0)")
+    conn.commit()
+
+def update_database():
+    try:
+        # Connect to SQLite
+        conn = connect(DB_PATH)
+        cursor = conn.cursor()
+
+        migrate_schema(conn)
 
         # Check Excel file
         excel_file = "students.xlsx"
@@ -56,44 +278,71 @@ def update_database():
             print(f"❌ Excel file not found: {excel_file}")
             return False
 
-        # Read Excel file
-        df = pd.read_excel(excel_file)
-        print(f"📊 Read {len(df)} students from Excel file")
+        avatars = scan_avatars(os.path.join("..", "avatars"))
+        print(f"📸 Found avatars for {len(avatars)} students")
 
+        # Stream rows into the students table, one transaction for the whole roster
+        total_rows = 0
         processed_count = 0
-        for _, row in df.iterrows():
-            student_id = row["student_id"]
-            name = row["name"]
-            class_ = row["class"]
-            major = row["major"]
-
-            # Find first image in student_id/ folder
-            folder_path = os.path.join("..", "avatars", student_id)
-            image_files = glob(os.path.join(folder_path, "*.*"))
-
-            if not image_files:
-                print(f"⚠️ No image found for {student_id}, skipping...")
+        errors = []  # (row number, student_id, message)
+
+        def insert_batch(batch):
+            try:
+                cursor.executemany("""
+                    INSERT OR REPLACE INTO students (student_id, name, class, major, avatar, avatar_thumb, avatar_version, attendance_time)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """, [values for _, values in batch])
+                return len(batch)
+            except sqlite3.Error:
+                # Find the offending rows one by one
+                inserted = 0
+                for row_number, values in batch:
+                    try:
+                        cursor.execute("""
+                            INSERT OR REPLACE INTO students (student_id, name, class, major, avatar, avatar_thumb, avatar_version, attendance_time)
+                            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                        """, values)
+                        inserted += 1
+                    except sqlite3.Error as e:
+                        errors.append((row_number, values[0], str(e)))
+                return inserted
+
+        batch = []
+        for row_number, row in read_roster(excel_file):
+            total_rows += 1
+            student_id = row.get("student_id")
+            if not student_id:
+                errors.append((row_number, None, "Missing student_id"))
                 continue
 
-            # Get first image
-            image_path = image_files[0]
+            image_path = avatars.get(student_id)
+            if not image_path:
+                errors.append((row_number, student_id, "No image found"))
+                continue
             try:
                 with open(image_path, "rb") as f:
-                    avatar_blob = f.read()
-            except Exception as e:
-                print(f"❌ Error reading image {image_path}: {str(e)}")
+                    thumbnails = make_avatars(f.read())
+            except OSError as e:
+                errors.append((row_number, student_id, f"Error reading image {image_path}: {e}"))
+                continue
+            if thumbnails is None:
+                errors.append((row_number, student_id, f"Unable to decode image {image_path}"))
                 continue
 
-            # Save to SQLite
-            try:
-                cursor.execute("""
-                    INSERT OR REPLACE INTO students (student_id, name, class, major, avatar, attendance_time)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                """, (student_id, name, class_, major, avatar_blob, None))
-                processed_count += 1
-                print(f"✅ Added student: {student_id} - {name}")
-            except Exception as e:
-                print(f"❌ Error adding student {student_id}: {str(e)}")
+            # Only the fixed-size thumbnails are stored, never the original file
+            batch.append((row_number, (student_id, row.get("name"), row.get("class"), row.get("major")) + thumbnails + (None,)))
+            if len(batch) >= BATCH_SIZE:
+                processed_count += insert_batch(batch)
+                batch = []
+                print(f"⏳ Imported {processed_count} students")
+        if batch:
+            processed_count += insert_batch(batch)
+
+        print(f"📊 Read {total_rows} students from Excel file")
+        for row_number, student_id, message in errors[:MAX_REPORTED_ERRORS]:
+            print(f"⚠️ Row {row_number} ({student_id or 'no student_id'}): {message}, skipping...")
+        if len(errors) > MAX_REPORTED_ERRORS:
+            print(f"⚠️ ... and {len(errors) - MAX_REPORTED_ERRORS} more rows skipped")
 
         # Add sample teacher accounts
         def hash_password(password):
@@ -119,10 +368,12 @@ def update_database():
                 print(f"❌ Error adding teacher {username}: {str(e)}")
 
         print("✅ Added sample teacher accounts")
+        # Committed with the import, tells running kiosks to reload cached profiles and avatars
+        cursor.execute("UPDATE roster_version SET version = version + 1")
         conn.commit()
         conn.close()
         
-        print(f"🎉 Completed! Processed {processed_count}/{len(df)} students.")
+        print(f"🎉 Completed! Processed {processed_count}/{total_rows} students.")
         return True
 
     except Exception as e:
@@ -0,0 +1,111 @@
+import asyncio
+import os
+import queue
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+DB_PATH = os.environ.get("STUDENTS_DB", "students.db")
+POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "4"))
+
+# WAL lets the kiosk writer and API readers work at the same time; NORMAL sync is
+# durable in WAL mode except for the last commits on power loss
+PRAGMAS = (
+    ("journal_mode", "WAL"),
+    ("synchronous", "NORMAL"),
+    ("mmap_size", 256 * 1024 * 1024),
+    ("cache_size", -16000),  # Negative means KiB, about 16 MB per connection
+    ("temp_store", "MEMORY"),
+)
+
+def connect(db_path=DB_PATH, row_factory=sqlite3.Row, timeout=10):
+    """Open a connection to the students database with the shared PRAGMAs applied"""
+    conn = sqlite3.connect(db_path, timeout=timeout, check_same_thread=False)
+    conn.row_factory = row_factory
+    for name, value in PRAGMAS:
+        conn.execute(f"PRAGMA {name} = {value}")
+    return conn
+
+class ConnectionPool:
+    """A few long-lived connections shared by threads, plus an executor for async callers.
+
+    connection() lends one out for the duration of a with block. The async
+    run()/fetchall()/fetchone()/execute() helpers do the work on the pool's
+    own threads, so FastAPI routes never block the event loop on SQLite.
+    """
+
+    def __init__(self, db_path=DB_PATH, size=POOL_SIZE):
+        self.db_path = db_path
+        self.size = size
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=size, thread_name_prefix="db")
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            create = self._created < self.size
+            if create:
+                self._created += 1
+        if create:
+            try:
+                return connect(self.db_path)
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+        return self._idle.get()
+
+    @contextmanager
+    def connection(self):
+        conn = self._acquire()
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()  # Never hand out a connection holding locks
+            self._idle.put(conn)
+
+    def _call(self, fn, args):
+        with self.connection() as conn:
+            return fn(conn, *args)
+
+    async def run(self, fn, *args):
+        """Await fn(conn, *args) run on a pool thread"""
+        return await asyncio.get_running_loop().run_in_executor(self._executor, self._call, fn, args)
+
+    async def fetchall(self, sql, params=()):
+        return await self.run(lambda conn: conn.execute(sql, params).fetchall())
+
+    async def fetchone(self, sql, params=()):
+        return await self.run(lambda conn: conn.execute(sql, params).fetchone())
+
+    async def execute(self, sql, params=()):
+        """Run one write statement in its own transaction"""
+        def write(conn):
+            with conn:
+                return conn.execute(sql, params).rowcount
+        return await self.run(write)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+def get_pool(db_path=DB_PATH):
+    """Process-wide pool for a database file"""
+    with _pools_lock:
+        if db_path not in _pools:
+            _pools[db_path] = ConnectionPool(db_path)
+        return _pools[db_path]
@@ -0,0 +1,111 @@
+import cv2
+
+def expand_box(box, margin, width, height):
+    """Grow (x, y, w, h) by margin * size on every side, clipped to the frame"""
+    x, y, w, h = box
+    dx, dy = int(w * margin), int(h * margin)
+    x0, y0 = max(0, x - dx), max(0, y - dy)
+    x1, y1 = min(width, x + w + dx), min(height, y + h + dy)
+    return (x0, y0, x1 - x0, y1 - y0)
+
+def merge_boxes(boxes):
+    """Merge overlapping (x, y, w, h) boxes until none overlap"""
+    boxes = list(boxes)
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(boxes)):
+            for j in range(i + 1, len(boxes)):
+                ax, ay, aw, ah = boxes[i]
+                bx, by, bw, bh = boxes[j]
+                if ax < bx + bw and bx < ax + aw and ay < by + bh and by < ay + ah:
+                    x0, y0 = min(ax, bx), min(ay, by)
+                    x1, y1 = max(ax + aw, bx + bw), max(ay + ah, by + bh)
+                    boxes[i] = (x0, y0, x1 - x0, y1 - y0)
+                    del boxes[j]
+                    merged = True
+                    break
+            if merged:
+                break
+    return boxes
+
+class FaceDetector:
+    """Motion-gated Haar detection on a downscaled frame.
+
+    Each call first diffs the downscaled frame against the previous one.
+    When nothing moved, the previous detections are returned without running
+    the cascade. Otherwise the cascade only scans the regions around motion
+    and existing tracks (or the whole downscaled frame when those cover most
+    of it), and boxes are mapped back to full resolution. A full scan still
+    runs every full_scan_interval calls so faces are never missed for long.
+    """
+
+    def __init__(self, face_cascade, scale=0.5, motion_threshold=25, min_motion_ratio=0.002,
+                 roi_margin=0.5, full_scan_ratio=0.5, full_scan_interval=30):
+        self.face_cascade = face_cascade
+        self.scale = scale
+        self.motion_threshold = motion_threshold
+        self.min_motion_ratio = min_motion_ratio
+        self.roi_margin = roi_margin
+        self.full_scan_ratio = full_scan_ratio
+        self.full_scan_interval = full_scan_interval
+
+        self.counts = {"skipped": 0, "roi": 0, "full": 0}
+        self._previous = None
+        self._last_faces = []
+        self._calls_since_full = 0
+
+    def _motion_boxes(self, small):
+        """Bounding boxes of changed regions in the downscaled frame, or None when static"""
+        blurred = cv2.GaussianBlur(small, (5, 5), 0)
+        previous, self._previous = self._previous, blurred
+        if previous is None or previous.shape != blurred.shape:
+            return [(0, 0, blurred.shape[1], blurred.shape[0])]
+
+        diff = cv2.absdiff(previous, blurred)
+        _, mask = cv2.threshold(diff, self.motion_threshold, 255, cv2.THRESH_BINARY)
+        if cv2.countNonZero(mask) < self.min_motion_ratio * mask.size:
+            return None
+
+        mask = cv2.dilate(mask, None, iterations=2)
+        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        return [cv2.boundingRect(contour) for contour in contours]
+
+    def detect(self, frame, track_boxes=()):
+        """Return full-resolution (x, y, w, h) face boxes for a BGR frame"""
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        small = cv2.resize(gray, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+        height, width = small.shape
+
+        self._calls_since_full += 1
+        motion = self._motion_boxes(small)
+        full_scan_due = self._calls_since_full >= self.full_scan_interval
+        if motion is None and not full_scan_due:
+            self.counts["skipped"] += 1
+            return self._last_faces
+
+        # Regions worth scanning: motion plus where faces already are
+        regions = list(motion or [])
+        regions += [tuple(int(v * self.scale) for v in box) for box in track_boxes]
+        regions = merge_boxes(expand_box(box, self.roi_margin, width, height) for box in regions)
+        roi_area = sum(w * h for _, _, w, h in regions)
+
+        if full_scan_due or roi_area >= self.full_scan_ratio * width * height:
+            regions = [(0, 0, width, height)]
+            self._calls_since_full = 0
+            self.counts["full"] += 1
+        else:
+            self.counts["roi"] += 1
+
+        faces = []
+        for rx, ry, rw, rh in regions:
+            if rw < 24 or rh < 24:  # Smaller than the cascade window
+                continue
+            for x, y, w, h in self.face_cascade.detectMultiScale(small[ry:ry+rh, rx:rx+rw], 1.3, 5):
+                faces.append((
+                    int((rx + x) / self.scale), int((ry + y) / self.scale),
+                    int(w / self.scale), int(h / self.scale)
+                ))
+
+        self._last_faces = faces
+        return faces
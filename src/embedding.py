@@ -0,0 +1,180 @@
+import os
+import sys
+import threading
+import time
+import cv2
+import numpy as np
+import torch
+from facenet_pytorch import InceptionResnetV1
+
+# FaceNet model shared by recognition and enrollment.
+# Backends: "eager" (float32), "torchscript" (traced + frozen) or "int8" (dynamically quantized)
+BACKENDS = ("eager", "torchscript", "int8")
+MODEL_DIR = os.environ.get("FACENET_MODEL_DIR", "models")  # Local cache for weights and compiled models
+device = torch.device('cpu')
+
+_config = {
+    "backend": os.environ.get("FACENET_BACKEND", "eager"),
+    "threads": int(os.environ.get("FACENET_THREADS", "0"))  # 0 keeps torch's default
+}
+_model = None
+_model_lock = threading.Lock()
+
+def configure(backend=None, threads=None):
+    """Select inference backend and torch thread count; takes effect on next get_model()"""
+    global _model
+    if backend is not None:
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown backend {backend}, expected one of {', '.join(BACKENDS)}")
+        _config["backend"] = backend
+    if threads is not None:
+        _config["threads"] = threads
+    with _model_lock:
+        _model = None
+
+def _artifact_path(name):
+    os.makedirs(MODEL_DIR, exist_ok=True)
+    return os.path.join(MODEL_DIR, f"{name}-torch{torch.__version__.split('+')[0]}.pt")
+
+def _embedding_weights(state_dict):
+    """State dict without the vggface2 classifier (logits.*), which embedding models don't have"""
+    return {key: value for key, value in state_dict.items() if not key.startswith("logits.")}
+
+def _load_eager():
+    """InceptionResnetV1 with vggface2 weights, read from the local cache after the first download"""
+    weights_path = os.path.join(MODEL_DIR, "inception_resnet_v1_vggface2.pt")
+    if os.path.exists(weights_path):
+        model = InceptionResnetV1(pretrained=None, classify=False)
+        # Caches written by older versions still hold the classifier
+        model.load_state_dict(_embedding_weights(torch.load(weights_path, map_location=device)))
+    else:
+        model = InceptionResnetV1(pretrained='vggface2')
+        os.makedirs(MODEL_DIR, exist_ok=True)
+        torch.save(_embedding_weights(model.state_dict()), weights_path)
+    return model.eval().to(device)
+
+def _compile(build_model, name):
+    """Trace and freeze a model into a TorchScript artifact, reusing a cached one if present"""
+    path = _artifact_path(name)
+    if os.path.exists(path):
+        return torch.jit.load(path, map_location=device)
+
+    model = build_model()
+    example = torch.zeros(2, 3, 160, 160, device=device)
+    with torch.no_grad():
+        compiled = torch.jit.freeze(torch.jit.trace(model, example))
+    torch.jit.save(compiled, path)
+    return compiled
+
+def load_model(backend):
+    """Build (or load from cache) the model for one backend and run a warm-up pass"""
+    if backend == "eager":
+        model = _load_eager()
+    elif backend == "torchscript":
+        model = _compile(_load_eager, "facenet-torchscript")
+    elif backend == "int8":
+        # Dynamic quantization covers the Linear layers; convolutions stay float32
+        model = _compile(lambda: torch.ao.quantization.quantize_dynamic(_load_eager(), {torch.nn.Linear}, dtype=torch.qint8),
+                         "facenet-int8")
+    else:
+        raise ValueError(f"Unknown backend {backend}, expected one of {', '.join(BACKENDS)}")
+
+    # Warm-up so the first real frame doesn't pay for lazy initialization
+    with torch.no_grad():
+        model(torch.zeros(1, 3, 160, 160, device=device))
+    return model
+
+def get_model():
+    """Load the configured model once and reuse it"""
+    global _model
+    with _model_lock:
+        if _model is None:
+            if _config["threads"] > 0:
+                torch.set_num_threads(_config["threads"])
+            start = time.perf_counter()
+            _model = load_model(_config["backend"])
+            print(f"✅ Loaded FaceNet ({_config['backend']}, {torch.get_num_threads()} threads) in {time.perf_counter() - start:.1f}s")
+        return _model
+
+def model_version():
+    """Identity of the configured model, so cached embeddings are never mixed across models"""
+    return f"facenet-vggface2-{_config['backend']}"
+
+def preprocess_face(face_img):
+    """Resize BGR face crop to 160x160 RGB"""
+    face_img = cv2.resize(face_img, (160, 160))
+    return cv2.cvtColor(face_img, cv2.COLOR_BGR2RGB)
+
+def _to_batch(face_imgs):
+    batch = np.stack([preprocess_face(face_img) for face_img in face_imgs]).astype(np.float32) / 255.0
+    return torch.from_numpy(batch).permute(0, 3, 1, 2).to(device)
+
+def _embed(model, batch):
+    with torch.no_grad():
+        embeddings = model(batch).cpu().numpy()
+    return embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+
+def get_face_embeddings(face_imgs):
+    """Generate L2-normalized (N, 512) embeddings for N face crops in one forward pass"""
+    if len(face_imgs) == 0:
+        return np.zeros((0, 512), dtype=np.float32)
+    return _embed(get_model(), _to_batch(face_imgs))
+
+def get_face_embedding(face_img):
+    """Generate embedding from a single face image"""
+    return get_face_embeddings([face_img])[0]
+
+def compare_backends(face_imgs, backends=BACKENDS, repeats=3):
+    """Embedding drift of each backend against eager, plus time per batch"""
+    batch = _to_batch(face_imgs)
+    reference = None
+    report = {}
+    for backend in ("eager",) + tuple(b for b in backends if b != "eager"):
+        model = load_model(backend)
+        start = time.perf_counter()
+        for _ in range(repeats):
+            embeddings = _embed(model, batch)
+        elapsed = (time.perf_counter() - start) / repeats
+        if reference is None:
+            reference = embeddings
+        cosine = np.sum(embeddings * reference, axis=1)
+        report[backend] = {
+            "batch_time": elapsed,
+            "min_cosine": float(cosine.min()),
+            "mean_cosine": float(cosine.mean()),
+            "max_abs_diff": float(np.abs(embeddings - reference).max())
+        }
+    return report
+
+def load_sample_faces(images_path="../avatars", limit=64):
+    """Face crops from enrollment images, for compare_backends"""
+    face_cascade = cv2.CascadeClassifier('haarcascade_frontalface_default.xml')
+    face_imgs = []
+    for root, _, files in os.walk(images_path):
+        for image_file in sorted(files):
+            if not image_file.lower().endswith(('.png', '.jpg', '.jpeg')):
+                continue
+            img = cv2.imread(os.path.join(root, image_file))
+            if img is None:
+                continue
+            faces = face_cascade.detectMultiScale(cv2.cvtColor(img, cv2.COLOR_BGR2GRAY), 1.3, 5)
+            if len(faces) > 0:
+                x, y, w, h = faces[0]
+                face_imgs.append(img[y:y+h, x:x+w])
+            if len(face_imgs) >= limit:
+                return face_imgs
+    return face_imgs
+
+if __name__ == "__main__":
+    # Report drift and speed of every backend against eager on the enrollment images
+    if _config["threads"] > 0:
+        torch.set_num_threads(_config["threads"])
+    faces = load_sample_faces()
+    if not faces:
+        print("❌ No faces found in ../avatars")
+        sys.exit(1)
+    print(f"📊 Comparing backends on {len(faces)} faces ({torch.get_num_threads()} threads)")
+    for backend, result in compare_backends(faces).items():
+        print(f"   {backend:12s} {result['batch_time'] * 1000:8.1f} ms/batch | "
+              f"cosine vs eager min {result['min_cosine']:.5f} mean {result['mean_cosine']:.5f} | "
+              f"max abs diff {result['max_abs_diff']:.5f}")
@@ -0,0 +1,101 @@
+import json
+import os
+import numpy as np
+
+STORE_DIR = os.environ.get("EMBEDDING_STORE_DIR", "embeddings")
+
+class EmbeddingStore:
+    """Persistent face embeddings keyed by image hash, one store per model version.
+
+    Vectors live in <model_version>.npy, which readers memory-map, and a
+    sidecar <model_version>.json lists the image hash, student_id and image
+    path of each row (one row per enrolled image, like the Qdrant points). data.py writes it during enrollment; recognizers can
+    warm-start from it without Qdrant or FaceNet.
+    """
+
+    def __init__(self, model_version, store_dir=STORE_DIR):
+        self.model_version = model_version
+        self.store_dir = store_dir
+        self.vectors_path = os.path.join(store_dir, f"{model_version}.npy")
+        self.index_path = os.path.join(store_dir, f"{model_version}.json")
+
+        self.vectors = np.zeros((0, 512), dtype=np.float32)
+        self.entries = []  # [{"hash", "student_id", "image_path"}] parallel to vectors
+        self._rows = {}  # image hash -> first row with that hash
+        self._added = {}  # image hash -> (vector, entry) not saved yet
+
+    def __len__(self):
+        return len(self.entries)
+
+    @classmethod
+    def open(cls, model_version, store_dir=STORE_DIR):
+        """Open a store, memory-mapping its vectors if it exists on disk"""
+        store = cls(model_version, store_dir)
+        if os.path.exists(store.vectors_path) and os.path.exists(store.index_path):
+            try:
+                with open(store.index_path, "r", encoding="utf-8") as f:
+                    entries = json.load(f)["entries"]
+                vectors = np.load(store.vectors_path, mmap_mode="r")
+                if len(vectors) == len(entries):
+                    store.vectors = vectors
+                    store.entries = entries
+                    for i, entry in enumerate(entries):
+                        store._rows.setdefault(entry["hash"], i)
+                else:
+                    print(f"⚠️ Embedding store {store.vectors_path} doesn't match its index, ignoring it")
+            except (OSError, ValueError, KeyError) as e:
+                print(f"⚠️ Unable to read embedding store {store.vectors_path}: {e}")
+        return store
+
+    def get(self, image_hash):
+        """Cached embedding for an image, or None"""
+        if image_hash in self._added:
+            return self._added[image_hash][0]
+        row = self._rows.get(image_hash)
+        return None if row is None else np.asarray(self.vectors[row])
+
+    def put(self, image_hash, vector, student_id, image_path):
+        self._added[image_hash] = (
+            np.asarray(vector, dtype=np.float32),
+            {"hash": image_hash, "student_id": student_id, "image_path": image_path}
+        )
+
+    def save(self, keep=None):
+        """Write the store to disk, one row per (image_hash, student_id, image_path) in keep (default: everything)"""
+        if keep is None:
+            keep = [(entry["hash"], entry["student_id"], entry["image_path"]) for entry in self.entries]
+            keep += [(image_hash, entry["student_id"], entry["image_path"]) for image_hash, (_, entry) in self._added.items()]
+
+        rows = []
+        entries = []
+        seen = set()
+        for image_hash, student_id, image_path in keep:
+            vector = self.get(image_hash)
+            # Identical copies of an image enrolled for the same student share a row, like they share a Qdrant point
+            if vector is None or (image_hash, student_id) in seen:
+                continue
+            seen.add((image_hash, student_id))
+            rows.append(vector)
+            entries.append({"hash": image_hash, "student_id": student_id, "image_path": image_path})
+
+        vectors = np.stack(rows).astype(np.float32) if rows else np.zeros((0, 512), dtype=np.float32)
+        os.makedirs(self.store_dir, exist_ok=True)
+        tmp_vectors = self.vectors_path + ".tmp.npy"
+        tmp_index = self.index_path + ".tmp"
+        np.save(tmp_vectors, vectors)
+        with open(tmp_index, "w", encoding="utf-8") as f:
+            json.dump({"model_version": self.model_version, "entries": entries}, f)
+        # Replace vectors first; readers check that both files agree in length
+        os.replace(tmp_vectors, self.vectors_path)
+        os.replace(tmp_index, self.index_path)
+
+        self.vectors = np.load(self.vectors_path, mmap_mode="r")
+        self.entries = entries
+        self._rows = {}
+        for i, entry in enumerate(entries):
+            self._rows.setdefault(entry["hash"], i)
+        self._added = {}
+
+    def student_matrix(self):
+        """(vectors, student_ids) for matching, vectors stay memory-mapped"""
+        return self.vectors, np.array([entry["student_id"] for entry in self.entries], dtype=object)
@@ -0,0 +1,177 @@
+import hashlib
+import queue
+import threading
+import cv2
+import numpy as np
+from qdrant_client import QdrantClient
+from qdrant_client.models import PointStruct, PointIdsList
+from data import MANIFEST_PATH, crop_face, load_manifest, point_id_for, save_manifest
+from embedding import get_face_embeddings, model_version
+from embedding_store import EmbeddingStore
+from qdrant_versions import create_version, publish_version
+
+class StreamingEnroller:
+    """Enroll uploaded images while the rest of an upload is still arriving.
+
+    submit() takes the raw bytes of one image; a worker thread decodes it in
+    memory, detects the face, embeds faces in batches of up to batch_size and
+    upserts each batch to Qdrant straight away. The enrollment manifest and
+    embedding store are updated as well, so the process-data job that runs
+    after the upload only has to reconcile deletions, prototypes and the ANN
+    index instead of re-reading every image.
+    """
+
+    def __init__(self, qdrant_host="localhost", qdrant_port=6333, collection_name="faces",
+                 batch_size=32, batch_timeout=0.5, manifest_path=MANIFEST_PATH):
+        self.qdrant_host = qdrant_host
+        self.qdrant_port = qdrant_port
+        self.collection_name = collection_name
+        self.batch_size = batch_size
+        self.batch_timeout = batch_timeout
+        self.manifest_path = manifest_path
+
+        self.counts = {"queued": 0, "enrolled": 0, "no_face": 0, "failed": 0}
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._idle = threading.Event()
+        self._idle.set()
+        self._thread = None
+        self._client = None
+
+    def status(self):
+        with self._lock:
+            return {"busy": not self._idle.is_set(), **self.counts}
+
+    def busy(self):
+        return not self._idle.is_set()
+
+    def wait(self, timeout=None):
+        """Block until everything submitted so far is enrolled"""
+        return self._idle.wait(timeout)
+
+    def submit(self, student_id, image_path, data):
+        """Queue one uploaded image (already saved at image_path) for enrollment"""
+        with self._lock:
+            if self._idle.is_set():
+                # New upload session
+                self.counts = {"queued": 0, "enrolled": 0, "no_face": 0, "failed": 0}
+            self.counts["queued"] += 1
+            self._idle.clear()
+            self._queue.put((student_id, image_path, data))
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._worker, daemon=True)
+                self._thread.start()
+
+    def _count(self, key, n=1):
+        with self._lock:
+            self.counts[key] += n
+            self.counts["queued"] -= n
+
+    def _next_batch(self):
+        """Wait for one image, then take whatever else arrives within batch_timeout"""
+        batch = [self._queue.get()]
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get(timeout=self.batch_timeout))
+            except queue.Empty:
+                break
+        return batch
+
+    def _connect(self):
+        if self._client is None:
+            self._client = QdrantClient(host=self.qdrant_host, port=self.qdrant_port)
+            if not self._client.collection_exists(self.collection_name):
+                publish_version(self._client, self.collection_name, create_version(self._client, self.collection_name))
+        return self._client
+
+    def _worker(self):
+        face_cascade = cv2.CascadeClassifier('haarcascade_frontalface_default.xml')
+        manifest = None
+        dirty = False
+
+        while True:
+            batch = self._next_batch()
+            try:
+                if manifest is None:
+                    # Re-read after every idle period; a process-data job may have run in between
+                    try:
+                        manifest = load_manifest(self.manifest_path)
+                        store = EmbeddingStore.open(model_version())
+                    except Exception as e:
+                        print(f"❌ Error loading enrollment manifest: {e}")
+                        manifest = None
+                        self._count("failed", len(batch))
+                        continue
+                faces = []
+                for student_id, image_path, data in batch:
+                    try:
+                        image_hash = hashlib.sha256(data).hexdigest()
+                        entry = manifest.get(image_path)
+                        if entry and entry["hash"] == image_hash and entry["student_id"] == student_id:
+                            self._count("enrolled")  # Same image uploaded again
+                            continue
+                        img = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+                        face_img = crop_face(img, face_cascade) if img is not None else None
+                    except Exception as e:
+                        # Empty or truncated uploads make imdecode raise instead of returning None
+                        print(f"❌ Error reading uploaded image {image_path}: {e}")
+                        self._count("failed")
+                        continue
+                    if face_img is None:
+                        print(f"⚠️ {'No face found' if img is not None else 'Unable to read image'}: {image_path}")
+                        manifest[image_path] = {"hash": image_hash, "student_id": student_id, "point_id": None}
+                        dirty = True
+                        self._count("no_face")
+                        continue
+                    faces.append((student_id, image_path, image_hash, face_img))
+
+                if faces:
+                    try:
+                        cached = [store.get(image_hash) for _, _, image_hash, _ in faces]
+                        missing = [i for i, vector in enumerate(cached) if vector is None]
+                        for i, embedding in zip(missing, get_face_embeddings([faces[i][3] for i in missing])):
+                            cached[i] = embedding
+                            store.put(faces[i][2], embedding, faces[i][0], faces[i][1])
+
+                        points = [
+                            PointStruct(
+                                id=point_id_for(student_id, image_hash),
+                                vector=np.asarray(embedding).tolist(),
+                                payload={"student_id": student_id, "image_path": image_path, "image_hash": image_hash}
+                            )
+                            for (student_id, image_path, image_hash, _), embedding in zip(faces, cached)
+                        ]
+                        client = self._connect()
+                        client.upsert(collection_name=self.collection_name, points=points)
+                        replaced = set()
+                        for (student_id, image_path, image_hash, _), point in zip(faces, points):
+                            old_entry = manifest.get(image_path)
+                            if old_entry and old_entry.get("point_id") and old_entry["point_id"] != point.id:
+                                replaced.add(old_entry["point_id"])
+                            manifest[image_path] = {"hash": image_hash, "student_id": student_id, "point_id": point.id}
+                        # Points of overwritten images, unless an identical copy elsewhere still uses them
+                        stale_ids = list(replaced - {entry["point_id"] for entry in manifest.values()})
+                        if stale_ids:
+                            client.delete(collection_name=self.collection_name, points_selector=PointIdsList(points=stale_ids))
+                        dirty = True
+                        self._count("enrolled", len(faces))
+                        print(f"✅ Enrolled {len(faces)} uploaded image(s)")
+                    except Exception as e:
+                        # Left out of the manifest, so the next process-data job picks them up
+                        print(f"❌ Error enrolling uploaded images: {e}")
+                        self._count("failed", len(faces))
+            finally:
+                if self._queue.empty():
+                    # Persist once the upload has drained rather than after every batch
+                    if dirty:
+                        try:
+                            save_manifest(manifest, self.manifest_path)
+                            store.save(keep=[(entry["hash"], entry["student_id"], image_path)
+                                             for image_path, entry in sorted(manifest.items()) if entry.get("point_id")])
+                            dirty = False
+                        except Exception as e:
+                            print(f"❌ Error saving enrollment manifest: {e}")
+                    with self._lock:
+                        if self._queue.empty():
+                            manifest = None
+                            self._idle.set()
@@ -0,0 +1,213 @@
+import os
+import threading
+import time
+import numpy as np
+from ann_index import load_index
+from qdrant_versions import alias_target
+
+class FaceIndex:
+    """In-memory mirror of the Qdrant faces collection.
+
+    Qdrant stays the source of truth; this class keeps a contiguous
+    (N, 512) float32 matrix of its vectors plus a parallel array of
+    student_ids so a whole frame can be scored with one matrix product.
+    When Qdrant is unreachable or empty, the memory-mapped vectors of the
+    local EmbeddingStore (if given) are used instead.
+
+    If data.py built a <collection>_prototypes collection, a search first
+    scores the per-student prototypes and then re-ranks only the raw
+    vectors of the prototype_candidates best students.
+
+    With ann_path set, matching goes through the local ANN index file that
+    data.py builds instead, reloaded whenever the file changes.
+
+    Rebuilds publish a new collection version behind the collection alias;
+    the refresh thread polls the alias every poll_interval seconds and
+    reloads as soon as it points somewhere new, so no restart is needed.
+    """
+
+    def __init__(self, client, collection_name="faces", refresh_interval=60, scroll_batch=1000, store=None,
+                 prototype_candidates=3, ann_path=None, poll_interval=5):
+        self.client = client
+        self.store = store
+        self.ann_path = ann_path
+        self._ann = None
+        self._ann_mtime = None
+        self.collection_name = collection_name
+        self.refresh_interval = refresh_interval
+        self.poll_interval = poll_interval
+        self.versions = None  # (faces collection, prototypes collection) behind the aliases at the last load
+        self.scroll_batch = scroll_batch
+        self.prototype_candidates = prototype_candidates
+        # (matrix, student_ids, prototypes) is swapped as one tuple so readers never see a half-built index.
+        # prototypes is None or (prototype matrix, prototype student_ids, student_id -> raw rows)
+        self._snapshot = (np.zeros((0, 512), dtype=np.float32), np.array([], dtype=object), None)
+        self._refresh_thread = None
+        self._stop_event = threading.Event()
+
+    def __len__(self):
+        if self._ann is not None:
+            return len(self._ann)
+        return len(self._snapshot[1])
+
+    def load_ann(self):
+        """(Re)load the ANN index file if it changed since the last load"""
+        if self.ann_path is None or not os.path.exists(self.ann_path):
+            return False
+        mtime = os.path.getmtime(self.ann_path)
+        if mtime != self._ann_mtime:
+            try:
+                self._ann = load_index(self.ann_path)
+                self._ann_mtime = mtime
+                print(f"✅ Loaded {self._ann.kind} index of {len(self._ann)} vectors from {self.ann_path}")
+            except Exception as e:
+                print(f"⚠️ Unable to load ANN index {self.ann_path}: {e}")
+                return False
+        return True
+
+    def _resolve_versions(self):
+        """Concrete collections currently behind the faces and prototypes aliases"""
+        prototype_collection = f"{self.collection_name}_prototypes"
+        return (alias_target(self.client, self.collection_name) or self.collection_name,
+                alias_target(self.client, prototype_collection) or prototype_collection)
+
+    def _scroll(self, collection_name):
+        """(normalized matrix, student_ids) of every point in a collection"""
+        vectors = []
+        student_ids = []
+        offset = None
+        while True:
+            points, offset = self.client.scroll(
+                collection_name=collection_name,
+                limit=self.scroll_batch,
+                offset=offset,
+                with_payload=["student_id"],
+                with_vectors=True
+            )
+            for point in points:
+                vectors.append(point.vector)
+                student_ids.append(point.payload["student_id"])
+            if offset is None:
+                break
+
+        if vectors:
+            matrix = np.ascontiguousarray(vectors, dtype=np.float32)
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            matrix /= np.maximum(norms, 1e-12)
+        else:
+            matrix = np.zeros((0, 512), dtype=np.float32)
+        return matrix, np.array(student_ids, dtype=object)
+
+    def load(self):
+        """Pull every vector (and prototype, if any) from Qdrant and swap in a new snapshot"""
+        if self.load_ann():
+            return True
+        try:
+            # Read the versions the aliases point to, so a swap mid-scroll can't mix two versions
+            versions = self._resolve_versions()
+            collection, prototype_collection = versions
+            matrix, student_ids = self._scroll(collection)
+            self.versions = versions
+            if len(student_ids) == 0 and self.load_store():
+                return True
+
+            prototypes = None
+            if self.prototype_candidates and self.client.collection_exists(prototype_collection):
+                prototype_matrix, prototype_ids = self._scroll(prototype_collection)
+                if len(prototype_ids) > 0:
+                    rows = {}
+                    for row, student_id in enumerate(student_ids):
+                        rows.setdefault(student_id, []).append(row)
+                    prototypes = (prototype_matrix, prototype_ids,
+                                  {student_id: np.array(r) for student_id, r in rows.items()})
+
+            self._snapshot = (matrix, student_ids, prototypes)
+            return True
+        except Exception as e:
+            print(f"⚠️ Unable to load face index from Qdrant: {e}")
+            return self.load_store()
+
+    def load_store(self):
+        """Swap in the memory-mapped vectors of the local EmbeddingStore, without touching Qdrant"""
+        if self.store is None or len(self.store.entries) == 0:
+            return False
+        self._snapshot = self.store.student_matrix() + (None,)
+        return True
+
+    def start_refresh(self):
+        """Refresh the local mirror from Qdrant in a background thread"""
+        if self._refresh_thread is not None:
+            return
+
+        def refresh_worker():
+            last_load = time.monotonic()
+            while not self._stop_event.wait(self.poll_interval):
+                if self.load_ann():
+                    continue
+                try:
+                    versions = self._resolve_versions()
+                except Exception:
+                    versions = self.versions
+                if versions != self.versions or time.monotonic() - last_load >= self.refresh_interval:
+                    if versions != self.versions:
+                        print(f"🔄 Face collection changed, reloading from {versions[0]}")
+                    self.load()
+                    last_load = time.monotonic()
+
+        self._refresh_thread = threading.Thread(target=refresh_worker, daemon=True)
+        self._refresh_thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def search(self, embeddings):
+        """Return the best (student_id, score) for each row of an (M, 512) array"""
+        matrix, student_ids, prototypes = self._snapshot
+        embeddings = np.asarray(embeddings, dtype=np.float32).reshape(-1, 512)
+        if len(embeddings) == 0:
+            return []
+        ann = self._ann
+        if ann is not None:
+            return ann.search(embeddings)
+        if len(student_ids) == 0:
+            return [(None, 0.0)] * len(embeddings)
+        if prototypes is not None:
+            return self._search_prototypes(embeddings, matrix, student_ids, prototypes)
+
+        scores = embeddings @ matrix.T
+        best = np.argmax(scores, axis=1)
+        best_scores = scores[np.arange(len(embeddings)), best]
+        return [(student_ids[i], float(s)) for i, s in zip(best, best_scores)]
+
+    def _candidates(self, ranked, prototype_ids, rows):
+        """First prototype_candidates distinct students in ranked prototype order"""
+        candidates = []
+        for i in ranked:
+            if prototype_ids[i] not in candidates and prototype_ids[i] in rows:
+                candidates.append(prototype_ids[i])
+                if len(candidates) >= self.prototype_candidates:
+                    break
+        return candidates
+
+    def _search_prototypes(self, embeddings, matrix, student_ids, prototypes):
+        """Shortlist students by prototype score, then take the best raw vector among them"""
+        prototype_matrix, prototype_ids, rows = prototypes
+        prototype_scores = embeddings @ prototype_matrix.T
+        # Only the best few prototypes are ranked; a student can own several, hence the margin
+        shortlist = min(len(prototype_ids), self.prototype_candidates * 8)
+        results = []
+        for embedding, scores in zip(embeddings, prototype_scores):
+            top = np.argpartition(-scores, shortlist - 1)[:shortlist]
+            ranked = top[np.argsort(-scores[top])]
+            candidates = self._candidates(ranked, prototype_ids, rows)
+            if len(candidates) < self.prototype_candidates and shortlist < len(prototype_ids):
+                candidates = self._candidates(np.argsort(-scores), prototype_ids, rows)
+            if not candidates:
+                results.append((None, 0.0))
+                continue
+
+            candidate_rows = np.concatenate([rows[student_id] for student_id in candidates])
+            raw_scores = matrix[candidate_rows] @ embedding
+            best = int(np.argmax(raw_scores))
+            results.append((student_ids[candidate_rows[best]], float(raw_scores[best])))
+        return results
@@ -0,0 +1,121 @@
+import multiprocessing
+import threading
+import time
+import traceback
+import uuid
+
+JOB_KINDS = ("process-data", "update-database")
+
+def _run_job(kind, events):
+    """Entry point of the job worker process; reports ("progress", done, total) and ("done", success, message)"""
+    try:
+        if kind == "process-data":
+            from data import process_face_data
+            success = process_face_data(progress=lambda done, total: events.put(("progress", done, total)))
+        elif kind == "update-database":
+            from database import update_database
+            success = update_database()
+        else:
+            raise ValueError(f"Unknown job kind {kind}")
+        events.put(("done", bool(success), None if success else "Job reported failure, see server log"))
+    except Exception as e:
+        traceback.print_exc()
+        events.put(("done", False, str(e)))
+
+class JobConflict(Exception):
+    """A job of the same kind is already queued or running"""
+
+    def __init__(self, job):
+        super().__init__(f"{job['kind']} job {job['job_id']} is already {job['status']}")
+        self.job = job
+
+class JobManager:
+    """Runs long enrollment/database jobs in worker processes, one per kind at a time.
+
+    Job state is kept in memory and every change is passed to on_update(job),
+    which the API uses to push WebSocket events; status can also be polled.
+    """
+
+    def __init__(self, on_update=None, history=50):
+        self.on_update = on_update
+        self.history = history
+        self.jobs = {}  # job_id -> job dict, oldest first
+        self._lock = threading.Lock()
+        # spawn: the API process has running threads that a fork could copy in a bad state
+        self._context = multiprocessing.get_context("spawn")
+
+    def _update(self, job, **changes):
+        with self._lock:
+            job.update(changes)
+            snapshot = dict(job)
+        if self.on_update:
+            self.on_update(snapshot)
+
+    def get(self, job_id):
+        with self._lock:
+            job = self.jobs.get(job_id)
+            return dict(job) if job else None
+
+    def is_active(self, kind):
+        with self._lock:
+            return any(job["kind"] == kind and job["status"] in ("queued", "running") for job in self.jobs.values())
+
+    def list_jobs(self):
+        with self._lock:
+            return [dict(job) for job in reversed(list(self.jobs.values()))]
+
+    def submit(self, kind):
+        """Start a job and return its state, or raise JobConflict if one of that kind is active"""
+        if kind not in JOB_KINDS:
+            raise ValueError(f"Unknown job kind {kind}, expected one of {', '.join(JOB_KINDS)}")
+        with self._lock:
+            for job in self.jobs.values():
+                if job["kind"] == kind and job["status"] in ("queued", "running"):
+                    raise JobConflict(dict(job))
+            job = {
+                "job_id": uuid.uuid4().hex,
+                "kind": kind,
+                "status": "queued",
+                "done": 0,
+                "total": None,
+                "message": None,
+                "created_at": time.time(),
+                "started_at": None,
+                "finished_at": None
+            }
+            self.jobs[job["job_id"]] = job
+            # Forget the oldest finished jobs
+            finished = [job_id for job_id, j in self.jobs.items() if j["status"] in ("succeeded", "failed")]
+            for job_id in finished[:max(0, len(self.jobs) - self.history)]:
+                del self.jobs[job_id]
+
+        threading.Thread(target=self._supervise, args=(job,), daemon=True).start()
+        return dict(job)
+
+    def _supervise(self, job):
+        """Start the worker process and relay its events until it exits"""
+        events = self._context.Queue()
+        # Not a daemon: process_face_data starts its own process pool
+        process = self._context.Process(target=_run_job, args=(job["kind"], events))
+        process.start()
+        self._update(job, status="running", started_at=time.time())
+        print(f"🚀 Started {job['kind']} job {job['job_id']} (pid {process.pid})")
+
+        result = None
+        while result is None:
+            alive = process.is_alive()
+            try:
+                event = events.get(timeout=1)
+            except Exception:  # queue.Empty
+                if not alive:
+                    result = (False, f"Worker exited with code {process.exitcode}")
+                continue
+            if event[0] == "progress":
+                self._update(job, done=event[1], total=event[2])
+            else:
+                result = event[1:]
+        process.join()
+
+        success, message = result
+        self._update(job, status="succeeded" if success else "failed", message=message, finished_at=time.time())
+        print(f"{'✅' if success else '❌'} {job['kind']} job {job['job_id']} {'succeeded' if success else 'failed'}")
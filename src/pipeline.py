@@ -0,0 +1,345 @@
+import math
+import os
+import queue
+import threading
+import time
+import cv2
+import numpy as np
+from embedding import get_face_embeddings
+from tracker import FaceTracker
+from detection import FaceDetector
+
+class StageStats:
+    """Moving average of the time one pipeline stage spends per item"""
+
+    def __init__(self, alpha=0.1):
+        self.alpha = alpha
+        self.avg_time = None
+        self.count = 0
+
+    def add(self, seconds):
+        self.count += 1
+        if self.avg_time is None:
+            self.avg_time = seconds
+        else:
+            self.avg_time += self.alpha * (seconds - self.avg_time)
+
+    @property
+    def fps(self):
+        return 1.0 / self.avg_time if self.avg_time else 0.0
+
+END_OF_STREAM = object()  # Passed through the stages when a file or frame directory runs out
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp')
+
+def open_source(source, frame_interval=1 / 15):
+    """Iterate (frame, timestamp) from a device index, a video file or a directory of frames.
+
+    Devices are stamped with wall-clock time; files and frame directories
+    are stamped with their own playback position (added to the start time)
+    so time-based rules behave the same when they are processed faster
+    than real time.
+    """
+    start_time = time.time()
+    if isinstance(source, str) and os.path.isdir(source):
+        frame_files = sorted(f for f in os.listdir(source) if f.lower().endswith(IMAGE_EXTENSIONS))
+        for i, frame_file in enumerate(frame_files):
+            frame = cv2.imread(os.path.join(source, frame_file))
+            if frame is not None:
+                yield frame, start_time + i * frame_interval
+        return
+
+    cap = cv2.VideoCapture(source)
+    live = not isinstance(source, str)
+    if live:
+        cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
+        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
+    try:
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                if live:
+                    continue
+                return
+            if live:
+                yield frame, time.time()
+            else:
+                yield frame, start_time + cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+    finally:
+        cap.release()
+
+def put_latest(q, item):
+    """Put item into a bounded queue, dropping the oldest entry when it is full"""
+    while True:
+        try:
+            q.put_nowait(item)
+            return
+        except queue.Full:
+            try:
+                q.get_nowait()
+            except queue.Empty:
+                pass
+
+class EmbeddingWorker:
+    """One FaceNet worker shared by every camera pipeline.
+
+    Pipelines submit face crops with a callback; the worker takes whatever
+    is pending from all cameras and embeds it in a single forward pass.
+    Only the newest request per camera is kept, so one busy camera can't
+    make the others wait behind stale frames.
+    """
+
+    def __init__(self):
+        self.stats = StageStats()
+        self._pending = {}  # camera_id -> (face_imgs, callback)
+        self._condition = threading.Condition()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._worker, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        with self._condition:
+            self._condition.notify_all()
+
+    def submit(self, camera_id, face_imgs, callback):
+        with self._condition:
+            self._pending[camera_id] = (face_imgs, callback)
+            self._condition.notify()
+
+    def _worker(self):
+        while not self._stop_event.is_set():
+            with self._condition:
+                while not self._pending and not self._stop_event.is_set():
+                    self._condition.wait(0.5)
+                requests = list(self._pending.values())
+                self._pending.clear()
+            if not requests:
+                continue
+
+            start = time.perf_counter()
+            face_imgs = [face_img for imgs, _ in requests for face_img in imgs]
+            embeddings = get_face_embeddings(face_imgs)  # One forward pass for every camera
+            self.stats.add(time.perf_counter() - start)
+
+            offset = 0
+            for imgs, callback in requests:
+                callback(embeddings[offset:offset + len(imgs)])
+                offset += len(imgs)
+
+class RecognitionPipeline:
+    """Capture -> detect -> embed -> match for one camera.
+
+    Capture, detection and matching run in their own threads; embedding is
+    handed to an EmbeddingWorker that may be shared with other cameras.
+
+    In realtime mode (live cameras) stages are connected by small bounded
+    queues that drop the oldest item when full, so a slow inference never
+    stalls the camera and results are never more than a couple of frames
+    stale. The frame-skip rate follows the measured throughput of the
+    slowest processing stage. Otherwise (video files, frame directories)
+    the queues block instead, every frame_skip-th frame is processed and
+    capture runs only as fast as the stages downstream.
+
+    Faces are found by a motion-gated, downscaled FaceDetector and followed
+    by a FaceTracker, so only new tracks and tracks due for re-confirmation
+    are embedded and matched.
+    """
+
+    def __init__(self, source, face_cascade, face_index, on_match=None, tracker=None, embedder=None, detector=None,
+                 camera_id=None, queue_size=1, match_threshold=0.6, max_frame_skip=15,
+                 realtime=None, render=True, frame_skip=None):
+        self.source = source
+        self.camera_id = source if camera_id is None else camera_id
+        self.realtime = not isinstance(source, str) if realtime is None else realtime
+        self.render = render
+        self.detector = detector or FaceDetector(face_cascade)
+        self.face_index = face_index
+        self.on_match = on_match
+        self.tracker = tracker or FaceTracker()
+        self.embedder = embedder
+        self._owns_embedder = embedder is None
+        if self._owns_embedder:
+            self.embedder = EmbeddingWorker()
+        self.match_threshold = match_threshold
+        self.max_frame_skip = max_frame_skip
+
+        self.detect_queue = queue.Queue(maxsize=queue_size)
+        self.match_queue = queue.Queue(maxsize=queue_size)
+        self.stats = {name: StageStats() for name in ("capture", "detect", "embed", "match")}
+
+        self.adaptive_skip = frame_skip is None and self.realtime
+        self.frame_skip = frame_skip or (3 if self.realtime else 1)
+        self.frame = None  # Latest annotated frame for display
+        self.last_results = {}  # (x, y, w, h) -> (label, confidence)
+        self.frames_captured = 0
+        self.frames_processed = 0
+
+        self.finished = threading.Event()  # Set once the last frame of a file/directory is matched
+        self._stop_event = threading.Event()
+        self._threads = []
+
+    def start(self):
+        if self._owns_embedder:
+            self.embedder.start()
+        workers = [self._capture_worker, self._detect_worker, self._match_worker]
+        for worker in workers:
+            thread = threading.Thread(target=worker, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        self._stop_event.set()
+        if self._owns_embedder:
+            self.embedder.stop()
+
+    def _put(self, q, item):
+        """Drop stale items in realtime mode, otherwise wait for room"""
+        if self.realtime:
+            put_latest(q, item)
+            return
+        while not self._stop_event.is_set():
+            try:
+                q.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+    def _get(self, q):
+        """Wait for the next item while still noticing stop()"""
+        while not self._stop_event.is_set():
+            try:
+                return q.get(timeout=0.5)
+            except queue.Empty:
+                continue
+        return None
+
+    def _adapt_frame_skip(self):
+        """Process only as many frames as the slowest stage can keep up with"""
+        capture_time = self.stats["capture"].avg_time
+        stage_times = [self.stats[name].avg_time for name in ("detect", "embed", "match")]
+        stage_times = [t for t in stage_times if t is not None]
+        if not capture_time or not stage_times:
+            return
+        skip = math.ceil(max(stage_times) / capture_time)
+        self.frame_skip = max(1, min(self.max_frame_skip, skip))
+
+    def _track_results(self, detections):
+        results = {}
+        for track, box in detections:
+            if track.student_id is not None:
+                results[box] = (track.student_id, track.confidence)
+            else:
+                results[box] = ("Unknown", 0.0)
+        return results
+
+    def draw_results(self, frame):
+        for (x, y, w, h), (label, conf) in self.last_results.items():
+            color = (0, 255, 0) if conf > 0 else (255, 0, 0)
+            text = f"{label} ({conf:.2f})" if conf > 0 else label
+            cv2.rectangle(frame, (x, y), (x+w, y+h), color, 2)
+            cv2.putText(frame, text, (x, y-10), cv2.FONT_HERSHEY_SIMPLEX, 0.7, color, 2)
+
+    def _capture_worker(self):
+        frame_count = 0
+        last_time = time.perf_counter()
+        for frame, timestamp in open_source(self.source):
+            if self._stop_event.is_set():
+                return
+
+            frame = cv2.flip(frame, 1)
+            frame_count += 1
+            self.frames_captured = frame_count
+
+            if frame_count % self.frame_skip == 0:
+                self._put(self.detect_queue, (frame_count, timestamp, frame.copy() if self.render else frame))
+
+            if self.render:
+                self.draw_results(frame)
+                self.frame = frame
+
+            now = time.perf_counter()
+            self.stats["capture"].add(now - last_time)
+            last_time = now
+            if self.adaptive_skip:
+                self._adapt_frame_skip()
+
+        self._put(self.detect_queue, END_OF_STREAM)
+
+    def _detect_worker(self):
+        while True:
+            item = self._get(self.detect_queue)
+            if item is None:
+                return
+            if item is END_OF_STREAM:
+                self._put(self.match_queue, END_OF_STREAM)
+                return
+            frame_id, timestamp, frame = item
+            start = time.perf_counter()
+            faces = self.detector.detect(frame, [track.box for track in self.tracker.tracks.values()])
+
+            # Only new tracks and tracks due for re-confirmation go to the model
+            now = time.time()
+            detections = [(track, track.box) for track in self.tracker.update(faces)]
+            to_embed = []
+            for track, box in detections:
+                if self.tracker.needs_embedding(track, now):
+                    track.last_embedded = now
+                    to_embed.append((track, box))
+            self.last_results = self._track_results(detections)
+            self.stats["detect"].add(time.perf_counter() - start)
+            self._embed((frame_id, timestamp, frame, detections, to_embed))
+
+    def _embed(self, item):
+        """Send new face crops to the embedding worker; results go to the match queue"""
+        frame_id, timestamp, frame, detections, to_embed = item
+        if not to_embed:
+            self._put(self.match_queue, item + (np.zeros((0, 512), dtype=np.float32),))
+            return
+
+        start = time.perf_counter()
+        face_imgs = [frame[y:y+h, x:x+w] for _, (x, y, w, h) in to_embed]
+        done = threading.Event()
+
+        def on_embedded(embeddings):
+            self.stats["embed"].add(time.perf_counter() - start)
+            self._put(self.match_queue, item + (embeddings,))
+            done.set()
+
+        self.embedder.submit(self.camera_id, face_imgs, on_embedded)
+        if not self.realtime:
+            # Keep frames in order and let the embedder apply backpressure
+            while not done.wait(0.5) and not self._stop_event.is_set():
+                pass
+
+    def _match_worker(self):
+        while True:
+            item = self._get(self.match_queue)
+            if item is None:
+                return
+            if item is END_OF_STREAM:
+                self.finished.set()
+                return
+            frame_id, timestamp, frame, detections, to_embed, embeddings = item
+            start = time.perf_counter()
+            matches = self.face_index.search(embeddings)
+            for (track, _), (student_id, confidence) in zip(to_embed, matches):
+                if student_id is not None and confidence > self.match_threshold:
+                    self.tracker.set_identity(track, student_id, confidence)
+                else:
+                    self.tracker.set_identity(track, None, 0.0)
+
+            # Report every identified track, including those not re-embedded this frame
+            results = []
+            for track, (x, y, w, h) in detections:
+                if track.student_id is not None:
+                    results.append(((x, y, w, h), track.student_id, track.confidence, frame[y:y+h, x:x+w]))
+            self.last_results = self._track_results(detections)
+            self.frames_processed += 1
+            self.stats["match"].add(time.perf_counter() - start)
+
+            if self.on_match:
+                self.on_match(results, timestamp)
@@ -0,0 +1,59 @@
+import numpy as np
+
+PROTOTYPE_METHODS = ("mean", "medoids")
+
+def _normalize(matrix):
+    return matrix / np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+
+def medoids(vectors, k, iterations=10):
+    """Indexes of k medoids of L2-normalized vectors under cosine distance"""
+    if len(vectors) <= k:
+        return list(range(len(vectors)))
+    distances = 1.0 - vectors @ vectors.T
+
+    # Start from the most central vector, then repeatedly add the farthest one
+    chosen = [int(np.argmin(distances.sum(axis=1)))]
+    while len(chosen) < k:
+        chosen.append(int(np.argmax(distances[:, chosen].min(axis=1))))
+
+    for _ in range(iterations):
+        assignment = np.argmin(distances[:, chosen], axis=1)
+        updated = []
+        for cluster in range(k):
+            members = np.flatnonzero(assignment == cluster)
+            if len(members) == 0:
+                updated.append(chosen[cluster])
+                continue
+            within = distances[np.ix_(members, members)].sum(axis=1)
+            updated.append(int(members[np.argmin(within)]))
+        if updated == chosen:
+            break
+        chosen = updated
+    return chosen
+
+def build_prototypes(vectors, student_ids, method="mean", k=3):
+    """Representative vectors per student: their mean embedding, or k medoids of their images.
+
+    Returns (prototypes (P, 512) float32 normalized, student_ids of each prototype).
+    """
+    if method not in PROTOTYPE_METHODS:
+        raise ValueError(f"Unknown prototype method {method}, expected one of {', '.join(PROTOTYPE_METHODS)}")
+    vectors = _normalize(np.asarray(vectors, dtype=np.float32))
+    if len(vectors) == 0:
+        return np.zeros((0, 512), dtype=np.float32), np.array([], dtype=object)
+
+    # Group rows by student once: student s owns order[offsets[s]:offsets[s + 1]]
+    unique_ids, inverse = np.unique(np.asarray(student_ids, dtype=str), return_inverse=True)
+    order = np.argsort(inverse, kind="stable")
+    offsets = np.concatenate([[0], np.cumsum(np.bincount(inverse, minlength=len(unique_ids)))])
+    if method == "mean":
+        return _normalize(np.add.reduceat(vectors[order], offsets[:-1], axis=0)), unique_ids.astype(object)
+
+    prototypes = []
+    prototype_ids = []
+    for s, student_id in enumerate(unique_ids):
+        student_vectors = vectors[order[offsets[s]:offsets[s + 1]]]
+        for i in medoids(student_vectors, k):
+            prototypes.append(student_vectors[i])
+            prototype_ids.append(student_id)
+    return _normalize(np.stack(prototypes).astype(np.float32)), np.array(prototype_ids, dtype=object)
@@ -0,0 +1,64 @@
+import re
+from qdrant_client.models import (
+    Distance, VectorParams, CreateAlias, CreateAliasOperation, DeleteAlias, DeleteAliasOperation
+)
+
+# Rebuilds write into a new <alias>_v<N> collection and then move the alias onto it,
+# so readers of the alias never see an empty or half-built collection.
+
+def alias_target(client, alias):
+    """Collection the alias points to, or None"""
+    for description in client.get_aliases().aliases:
+        if description.alias_name == alias:
+            return description.collection_name
+    return None
+
+def _versions(client, alias):
+    """Existing versions of an alias as [(version, collection_name)], oldest first"""
+    pattern = re.compile(rf"^{re.escape(alias)}_v(\d+)$")
+    versions = []
+    for collection in client.get_collections().collections:
+        match = pattern.match(collection.name)
+        if match:
+            versions.append((int(match.group(1)), collection.name))
+    return sorted(versions)
+
+def create_version(client, alias, size=512):
+    """Create the next empty <alias>_v<N> collection and return its name"""
+    versions = _versions(client, alias)
+    collection_name = f"{alias}_v{versions[-1][0] + 1 if versions else 1}"
+    client.create_collection(
+        collection_name=collection_name,
+        vectors_config=VectorParams(size=size, distance=Distance.COSINE)
+    )
+    return collection_name
+
+def publish_version(client, alias, collection_name, keep=2):
+    """Atomically point the alias at collection_name, then drop all but the newest keep versions"""
+    # A plain collection from before versioning holds the alias name; it has to go first
+    if alias_target(client, alias) is None and client.collection_exists(alias):
+        client.delete_collection(alias)
+
+    operations = []
+    if alias_target(client, alias) is not None:
+        operations.append(DeleteAliasOperation(delete_alias=DeleteAlias(alias_name=alias)))
+    operations.append(CreateAliasOperation(create_alias=CreateAlias(collection_name=collection_name, alias_name=alias)))
+    client.update_collection_aliases(change_aliases_operations=operations)
+    print(f"🔄 {alias} now points to {collection_name}")
+
+    # The previous version stays around so recognizers mid-refresh can finish reading it
+    for _, old_name in _versions(client, alias)[:-keep]:
+        if old_name != collection_name:
+            client.delete_collection(old_name)
+            print(f"🗑️ Removed {old_name}")
+
+def drop_alias(client, alias):
+    """Remove an alias and every version behind it"""
+    if alias_target(client, alias) is not None:
+        client.update_collection_aliases(change_aliases_operations=[
+            DeleteAliasOperation(delete_alias=DeleteAlias(alias_name=alias))
+        ])
+    elif client.collection_exists(alias):
+        client.delete_collection(alias)
+    for _, old_name in _versions(client, alias):
+        client.delete_collection(old_name)
@@ -0,0 +1,287 @@
+import argparse
+import functools
+import threading
+import time
+import cv2
+from datetime import datetime
+from qdrant_client import QdrantClient
+from face_index import FaceIndex
+from embedding import BACKENDS, configure, get_model, model_version
+from embedding_store import EmbeddingStore
+from ann_index import ANN_KIND, index_path
+from pipeline import EmbeddingWorker, RecognitionPipeline
+from attendance_writer import AttendanceWriter
+from cache import LRUCache
+from db import DB_PATH, get_pool
+from database import roster_version
+
+ROSTER_CHECK_INTERVAL = 5.0  # Seconds between checks for a new roster import
+
+def is_already_attended(attendance_time):
+    """Check if student has already attended in the past 24 hours"""
+    if not attendance_time:
+        return False
+
+    try:
+        last_attendance = datetime.strptime(attendance_time, "%Y-%m-%d %H:%M:%S")
+        current_time = datetime.now()
+        time_diff = current_time - last_attendance
+        return time_diff.total_seconds() < 24 * 3600  # 24 hours = 86400 seconds
+    except:
+        return False
+
+def parse_sources(args):
+    """Camera device indexes, video file paths or frame directories, webcam 0 by default"""
+    sources = [int(arg) if arg.isdigit() else arg for arg in args]
+    return sources or [0]
+
+def new_camera_state():
+    return {
+        "recognition": {"student_id": None, "confidence": 0.0, "start_time": None},
+        "face_image": None,  # Current face image to save when checking in
+        "last_update_time": 0  # Last check-in time on this camera
+    }
+
+class RecognitionService:
+    """Detect/embed/match/check-in for one or more capture sources, without any GUI.
+
+    A student is checked in once they stay recognized above 0.8 for one
+    second, at most once per 3 s per camera and once per 10 s per student,
+    and only if they haven't attended in the past 24 hours. Every decision
+    is reported to on_checkin as a dict; the PyQt5 app in main.py is just
+    one consumer of these events.
+    """
+
+    def __init__(self, sources, on_checkin=None, on_roster_change=None, render=True, frame_skip=None,
+                 db_path=DB_PATH, qdrant_host="localhost", qdrant_port=6333, collection_name="faces"):
+        self.sources = sources
+        self.on_checkin = on_checkin
+        self.on_roster_change = on_roster_change  # Called on a recognition thread after a roster import, e.g. to drop cached avatars
+        self.render = render
+        self.frame_skip = frame_skip
+        self.db_path = db_path
+
+        self.client = QdrantClient(host=qdrant_host, port=qdrant_port)
+        # Local copy of Qdrant vectors for matching, falling back to the on-disk embedding store.
+        # With FACE_ANN set, the local ANN index built by data.py is used instead
+        store = EmbeddingStore.open(model_version())
+        self.face_index = FaceIndex(self.client, collection_name, store=store,
+                                    ann_path=index_path(store, ANN_KIND) if ANN_KIND else None)
+        self.attendance_writer = AttendanceWriter(db_path)  # Saves check-ins off the recognition threads
+        self.embedder = EmbeddingWorker()
+        self.pipelines = {}
+        self.camera_states = {}  # camera_id -> recognition state of that camera
+        self.checkin_count = 0
+
+        self.last_recognition_per_student = {}  # Last recognition time for each student
+        self.student_cache = LRUCache(maxsize=512)  # student_id -> (student_id, name, class, major)
+        self._lock = threading.Lock()
+        self.db_pool = get_pool(db_path)  # Camera threads read through a few shared WAL connections
+        self._roster_version = None
+        self._roster_checked = 0.0
+
+    def start(self):
+        # Load FaceNet before the cameras start
+        get_model()
+
+        # Load face vectors once, then keep them in sync with Qdrant in the background
+        if self.face_index.load():
+            print(f"✅ Loaded {len(self.face_index)} face vectors")
+        self.face_index.start_refresh()
+
+        self.attendance_writer.start()
+        self.embedder.start()
+
+        # One capture -> detect -> match pipeline per source, all sharing one embedding worker
+        for source in self.sources:
+            self.camera_states[source] = new_camera_state()
+            face_cascade = cv2.CascadeClassifier('haarcascade_frontalface_default.xml')
+            pipeline = RecognitionPipeline(source, face_cascade, self.face_index, embedder=self.embedder,
+                                           on_match=functools.partial(self.handle_recognition, source),
+                                           render=self.render, frame_skip=self.frame_skip)
+            pipeline.start()
+            self.pipelines[source] = pipeline
+
+    def stop(self):
+        for pipeline in self.pipelines.values():
+            pipeline.stop()
+        self.embedder.stop()
+        self.face_index.stop()
+        self.attendance_writer.stop()
+
+    def check_roster(self):
+        """Drop cached profiles once a roster import has committed; reads the version at most every ROSTER_CHECK_INTERVAL"""
+        with self._lock:
+            now = time.monotonic()
+            if now - self._roster_checked < ROSTER_CHECK_INTERVAL:
+                return
+            self._roster_checked = now
+        with self.db_pool.connection() as conn:
+            version = roster_version(conn)
+        if self._roster_version is not None and version != self._roster_version:
+            self.invalidate_student_info()
+            if self.on_roster_change:
+                self.on_roster_change()
+            print("🔄 Roster updated, cleared cached student profiles")
+        self._roster_version = version
+
+    def get_student_info(self, student_id):
+        """Get cached (student_id, name, class, major)"""
+        self.check_roster()
+        info = self.student_cache.get(student_id)
+        if info is None:
+            with self.db_pool.connection() as conn:
+                row = conn.execute("SELECT student_id, name, class, major FROM students WHERE student_id = ?", (student_id,)).fetchone()
+            info = tuple(row) if row else None
+            if info:
+                self.student_cache.put(student_id, info)
+        return info
+
+    def invalidate_student_info(self, student_id=None):
+        """Drop cached profile of one student, or of everyone when student_id is None"""
+        self.student_cache.invalidate(student_id)
+
+    def get_attendance_time(self, student_id):
+        """Get latest attendance time, always read from database"""
+        pending = self.attendance_writer.pending_time(student_id)  # Check-ins still being saved
+        if pending:
+            return pending
+        with self.db_pool.connection() as conn:
+            # Newest event of the student, one seek on idx_attendance_events_student
+            result = conn.execute("SELECT MAX(attendance_time) FROM attendance_events WHERE student_id = ?", (student_id,)).fetchone()
+        return result[0] if result else None
+
+    def handle_recognition(self, camera_id, results, timestamp):
+        """Update recognition status of one camera from the matches of a processed frame"""
+        state = self.camera_states[camera_id]
+        current_recognition = state["recognition"]
+
+        recognized_student = None
+        max_confidence = 0.0
+        best_face_image = None
+        for box, student_id, confidence, face_img in results:
+            if confidence > max_confidence:
+                max_confidence = confidence
+                recognized_student = student_id
+                best_face_image = face_img  # Save the best face image
+
+        # Update recognition status
+        if recognized_student and max_confidence > 0.8:
+            if (current_recognition["student_id"] != recognized_student or
+                current_recognition["confidence"] < 0.8):
+                state["recognition"] = {"student_id": recognized_student, "confidence": max_confidence, "start_time": timestamp}
+                state["face_image"] = best_face_image  # Save face image to use when checking in
+        elif max_confidence <= 0.8:
+            state["recognition"] = {"student_id": None, "confidence": 0.0, "start_time": None}
+            state["face_image"] = None
+
+        self.check_in(camera_id, timestamp)
+
+    def check_in(self, camera_id, now):
+        """Check in the student one camera has recognized for at least one second"""
+        state = self.camera_states[camera_id]
+        current_recognition = state["recognition"]
+        if not (current_recognition["student_id"] and
+                current_recognition["confidence"] > 0.8 and
+                current_recognition["start_time"] and
+                now - current_recognition["start_time"] >= 1.0):
+            return
+
+        student_id = current_recognition["student_id"]
+        confidence = current_recognition["confidence"]
+
+        # Check delay time to avoid continuous updates
+        with self._lock:
+            if now - state["last_update_time"] < 3:  # 3 seconds delay per camera
+                return
+            last_time = self.last_recognition_per_student.get(student_id)
+            if last_time is not None and now - last_time < 10:  # 10 seconds delay per student
+                return
+            state["last_update_time"] = now
+            self.last_recognition_per_student[student_id] = now
+
+        info = self.get_student_info(student_id)
+        if not info:
+            return
+
+        attendance_time = self.get_attendance_time(student_id)
+        already_attended = is_already_attended(attendance_time)
+        if not already_attended:
+            attendance_time = self.attendance_writer.submit(student_id, state["face_image"], camera_id, confidence)
+            self.checkin_count += 1
+
+        # Reset to avoid continuous updates
+        state["recognition"] = {"student_id": None, "confidence": 0.0, "start_time": None}
+
+        event = {
+            "camera_id": camera_id,
+            "student_id": info[0],
+            "name": info[1],
+            "class_name": info[2],
+            "major": info[3],
+            "confidence": confidence,
+            "attendance_time": attendance_time,
+            "already_attended": already_attended
+        }
+        if self.on_checkin:
+            self.on_checkin(event)
+
+    def report(self):
+        """Per-camera frame counts and stage throughput (items per second)"""
+        report = {"checkins": self.checkin_count, "embedder_fps": self.embedder.stats.fps, "cameras": {}}
+        for camera_id, pipeline in self.pipelines.items():
+            report["cameras"][camera_id] = {
+                "frames_captured": pipeline.frames_captured,
+                "frames_processed": pipeline.frames_processed,
+                "frame_skip": pipeline.frame_skip,
+                "detections": dict(pipeline.detector.counts),
+                "stage_fps": {name: stats.fps for name, stats in pipeline.stats.items()}
+            }
+        return report
+
+def print_checkin(event):
+    if event["already_attended"]:
+        print(f"ℹ️ [{event['camera_id']}] Already attended: {event['student_id']} - {event['name']} ({event['confidence']:.2f})")
+    else:
+        print(f"✅ [{event['camera_id']}] Checked in: {event['student_id']} - {event['name']} at {event['attendance_time']} ({event['confidence']:.2f})")
+
+def print_report(report):
+    print(f"📊 Check-ins: {report['checkins']} | Embedder: {report['embedder_fps']:.1f} batches/s")
+    for camera_id, camera in report["cameras"].items():
+        stages = ", ".join(f"{name} {fps:.1f}/s" for name, fps in camera["stage_fps"].items())
+        detections = camera["detections"]
+        print(f"   [{camera_id}] frames {camera['frames_processed']}/{camera['frames_captured']} "
+              f"(skip {camera['frame_skip']}) - {stages} | detection full {detections['full']}, "
+              f"roi {detections['roi']}, skipped {detections['skipped']}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless face recognition attendance service")
+    parser.add_argument("sources", nargs="*", help="Camera indexes, video files or directories of frames (default: 0)")
+    parser.add_argument("--frame-skip", type=int, default=None, help="Process every Nth frame (default: adaptive for cameras, 1 for files)")
+    parser.add_argument("--backend", choices=BACKENDS, default=None, help="FaceNet inference backend (default: $FACENET_BACKEND or eager)")
+    parser.add_argument("--threads", type=int, default=None, help="Torch intra-op threads (default: $FACENET_THREADS or torch default)")
+    parser.add_argument("--report-interval", type=float, default=10.0, help="Seconds between throughput reports")
+    args = parser.parse_args()
+    configure(backend=args.backend, threads=args.threads)
+
+    service = RecognitionService(parse_sources(args.sources), on_checkin=print_checkin,
+                                 render=False, frame_skip=args.frame_skip)
+    service.start()
+    print(f"🚀 Recognizing from {len(service.sources)} source(s) without GUI")
+
+    live = any(pipeline.realtime for pipeline in service.pipelines.values())
+    try:
+        last_report = time.time()
+        while live or not all(pipeline.finished.is_set() for pipeline in service.pipelines.values()):
+            time.sleep(0.5)
+            if time.time() - last_report >= args.report_interval:
+                print_report(service.report())
+                last_report = time.time()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.stop()
+        print_report(service.report())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+import itertools
+import threading
+import time
+
+def box_iou(a, b):
+    """Intersection over union of two (x, y, w, h) boxes"""
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    ix = max(0, min(ax + aw, bx + bw) - max(ax, bx))
+    iy = max(0, min(ay + ah, by + bh) - max(ay, by))
+    inter = ix * iy
+    union = aw * ah + bw * bh - inter
+    return inter / union if union > 0 else 0.0
+
+def centroid_distance(a, b):
+    """Distance between box centers, relative to the size of box a"""
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    dx = (ax + aw / 2) - (bx + bw / 2)
+    dy = (ay + ah / 2) - (by + bh / 2)
+    return (dx * dx + dy * dy) ** 0.5 / max(aw, ah, 1)
+
+class Track:
+    """A face followed across frames with its last known identity"""
+
+    def __init__(self, track_id, box):
+        self.track_id = track_id
+        self.box = box
+        self.misses = 0
+        self.student_id = None
+        self.confidence = 0.0
+        self.matched = False  # True once an embedding has been matched for this track
+        self.last_embedded = None
+
+class FaceTracker:
+    """Greedy IoU tracker with a centroid-distance fallback.
+
+    Detections keep a persistent track ID while they overlap (or stay close
+    to) the previous box, so embedding and matching only need to run when a
+    track appears or when its identity is due for re-confirmation.
+    """
+
+    def __init__(self, iou_threshold=0.3, max_centroid_distance=0.5, max_misses=3, reconfirm_interval=2.0):
+        self.iou_threshold = iou_threshold
+        self.max_centroid_distance = max_centroid_distance
+        self.max_misses = max_misses
+        self.reconfirm_interval = reconfirm_interval
+        self.tracks = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def update(self, boxes):
+        """Assign detections to tracks; returns the list of live tracks matched this frame"""
+        with self._lock:
+            pairs = []
+            for track in self.tracks.values():
+                for i, box in enumerate(boxes):
+                    iou = box_iou(track.box, box)
+                    if iou >= self.iou_threshold:
+                        pairs.append((1.0 + iou, track.track_id, i))
+                    else:
+                        distance = centroid_distance(track.box, box)
+                        if distance <= self.max_centroid_distance:
+                            pairs.append((1.0 - distance, track.track_id, i))
+            pairs.sort(reverse=True)
+
+            used_tracks = set()
+            used_boxes = set()
+            current = []
+            for _, track_id, i in pairs:
+                if track_id in used_tracks or i in used_boxes:
+                    continue
+                used_tracks.add(track_id)
+                used_boxes.add(i)
+                track = self.tracks[track_id]
+                track.box = boxes[i]
+                track.misses = 0
+                current.append(track)
+
+            for track_id, track in list(self.tracks.items()):
+                if track_id not in used_tracks:
+                    track.misses += 1
+                    if track.misses > self.max_misses:
+                        del self.tracks[track_id]
+
+            for i, box in enumerate(boxes):
+                if i not in used_boxes:
+                    track = Track(next(self._ids), box)
+                    self.tracks[track.track_id] = track
+                    current.append(track)
+
+            return current
+
+    def needs_embedding(self, track, now=None):
+        """Unmatched tracks and tracks due for re-confirmation need a fresh embedding"""
+        now = time.time() if now is None else now
+        if not track.matched or track.last_embedded is None:
+            return True
+        return now - track.last_embedded >= self.reconfirm_interval
+
+    def set_identity(self, track, student_id, confidence):
+        with self._lock:
+            track.student_id = student_id
+            track.confidence = confidence
+            track.matched = True
@@ -0,0 +1,52 @@
+import os
+import sys
+import tempfile
+from contextlib import contextmanager
+import torch
+from facenet_pytorch import InceptionResnetV1
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+import embedding
+
+def fake_inception(pretrained=None, classify=False, num_classes=None):
+    """Stands in for the vggface2 download: random weights, but with the 8631-class logits layer it ships with"""
+    model = InceptionResnetV1(pretrained=None, classify=classify, num_classes=num_classes)
+    if pretrained == 'vggface2':
+        model.logits = torch.nn.Linear(512, 8631)
+    return model
+
+@contextmanager
+def fake_model_dir():
+    """Temporary MODEL_DIR with fake_inception installed, both restored afterwards"""
+    original = embedding.InceptionResnetV1, embedding.MODEL_DIR
+    try:
+        with tempfile.TemporaryDirectory() as model_dir:
+            embedding.InceptionResnetV1 = fake_inception
+            embedding.MODEL_DIR = model_dir
+            yield model_dir
+    finally:
+        embedding.InceptionResnetV1, embedding.MODEL_DIR = original
+
+def test_load_model_twice():
+    """The second start loads the weights cached by the first one"""
+    with fake_model_dir() as model_dir:
+        first = embedding.load_model("eager")
+        assert os.path.exists(os.path.join(model_dir, "inception_resnet_v1_vggface2.pt"))
+        second = embedding.load_model("eager")
+
+        batch = torch.rand(2, 3, 160, 160)
+        with torch.no_grad():
+            assert torch.allclose(first(batch), second(batch))
+    print("✅ Model loaded twice from the same MODEL_DIR")
+
+def test_load_cache_with_logits():
+    """Weights cached by older versions still include the classifier"""
+    with fake_model_dir() as model_dir:
+        torch.save(fake_inception(pretrained='vggface2').state_dict(),
+                   os.path.join(model_dir, "inception_resnet_v1_vggface2.pt"))
+        embedding.load_model("eager")
+    print("✅ Model loaded from a cache with logits.*")
+
+if __name__ == "__main__":
+    test_load_model_twice()
+    test_load_cache_with_logits()
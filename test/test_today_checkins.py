@@ -0,0 +1,135 @@
+import asyncio
+import json
+import os
+import sys
+import tempfile
+from datetime import datetime
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+sys.path.insert(0, SRC)
+cwd = os.getcwd()
+os.chdir(SRC)  # api_main serves ../frontend relative to src
+try:
+    import api_main
+finally:
+    os.chdir(cwd)
+from database import migrate_schema
+from db import ConnectionPool, connect
+
+class SlowPool:
+    """Wraps a ConnectionPool so a test can act while a reload is awaiting the database"""
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.loading = asyncio.Event()
+        self.release = asyncio.Event()
+
+    async def run(self, fn, *args):
+        result = await self.pool.run(fn, *args)
+        self.loading.set()
+        await self.release.wait()
+        self.release.clear()
+        return result
+
+def make_database(db_path):
+    conn = connect(db_path)
+    migrate_schema(conn)
+    conn.execute("INSERT INTO students (student_id, name, class, major) VALUES ('S1', 'Old name', 'C1', 'M1')")
+    conn.execute("INSERT INTO students (student_id, name, class, major) VALUES ('S2', 'Second', 'C1', 'M1')")
+    conn.commit()
+    return conn
+
+def check_in(conn, student_id):
+    """Log a check-in for now and return its record, as /notify-attendance would build it"""
+    attendance_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    with conn:
+        event_id = conn.execute("INSERT INTO attendance_events (student_id, attendance_time) VALUES (?, ?)",
+                                (student_id, attendance_time)).lastrowid
+    row = conn.execute(f"""
+        SELECT {api_main.checkin_columns()}
+        FROM attendance_events AS latest JOIN students s ON s.student_id = latest.student_id
+        WHERE latest.id = ?
+    """, (event_id,)).fetchone()
+    return api_main.create_student_attendance(row, list(api_main.CHECKIN_FIELDS))
+
+def run_with_slow_pool(scenario):
+    """Run scenario(view, slow pool, connection) against a fresh database"""
+    original_pool = api_main.db_pool
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "students.db")
+        conn = make_database(db_path)
+        pool = ConnectionPool(db_path)
+        try:
+            async def main():
+                api_main.db_pool = SlowPool(pool)
+                await scenario(api_main.TodayCheckins(), api_main.db_pool, conn)
+            asyncio.run(main())
+        finally:
+            api_main.db_pool = original_pool
+            pool.close()
+            conn.close()
+
+def test_invalidate_during_reload():
+    """A roster import finishing mid-reload makes the view load again instead of keeping old names"""
+    async def scenario(view, slow, conn):
+        check_in(conn, "S1")
+        reload = asyncio.create_task(view.current())
+        await slow.loading.wait()
+        slow.loading.clear()
+
+        with conn:
+            conn.execute("UPDATE students SET name = 'New name' WHERE student_id = 'S1'")
+        view.invalidate()
+        slow.release.set()  # First load returns rows read before the rename
+
+        await asyncio.wait_for(slow.loading.wait(), 5)  # The second load, never started without the fix
+        slow.release.set()
+        await reload
+        assert view.day == datetime.now().date()
+        assert view.records["S1"]["name"] == "New name"
+    run_with_slow_pool(scenario)
+    print("✅ Invalidation during a reload triggers another load")
+
+def test_add_during_reload():
+    """Check-ins reported mid-reload are replayed once, whether or not the load saw them"""
+    async def scenario(view, slow, conn):
+        first = check_in(conn, "S1")
+        reload = asyncio.create_task(view.current())
+        await slow.loading.wait()
+
+        view.add(first)  # Already in the loaded rows
+        second = check_in(conn, "S2")
+        view.add(second)  # Committed after the load read the log
+        view.add({**first, "event_id": first["event_id"] - 1})  # Out of order
+        slow.release.set()
+        await reload
+
+        assert [record["event_id"] for record in view.order] == [second["event_id"], first["event_id"]]
+        assert view.latest_event_id == second["event_id"]
+
+        third = check_in(conn, "S1")
+        view.add(third)  # No reload in progress, applied straight away
+        assert view.records["S1"]["event_id"] == third["event_id"]
+    run_with_slow_pool(scenario)
+    print("✅ Check-ins reported during a reload are replayed")
+
+def test_page_totals():
+    """total counts every student checked in today, count only the page"""
+    async def scenario(view, slow, conn):
+        for student_id in ("S1", "S2"):
+            check_in(conn, student_id)
+        slow.release.set()
+        await view.current()
+        first = json.loads(view.page(1, None, None, None))
+        assert (first["total"], first["count"]) == (2, 1)
+        second = json.loads(view.page(1, int(first["next_cursor"]), None, None))
+        assert (second["total"], second["count"], second["next_cursor"]) == (2, 1, None)
+        newer = json.loads(view.page(1, None, None, ("id", first["data"][0]["event_id"])))
+        assert (newer["total"], newer["count"]) == (0, 0)
+    run_with_slow_pool(scenario)
+    print("✅ Pages report the full total")
+
+if __name__ == "__main__":
+    test_invalidate_during_reload()
+    test_add_during_reload()
+    test_page_totals()